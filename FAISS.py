@@ -1,13 +1,15 @@
-import faiss
 import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
+from case_dataset import load_dataset
+from embedding_cache import EmbeddingCache
+from embedding_server import load_model
+from index_bundle import build_bundle
+
 # 讀取數據
 try:
-    df = pd.read_csv('C:/Users/李/Desktop/數據分析/outputarea/Tovector.csv')
+    df = load_dataset('C:/Users/李/Desktop/數據分析/outputarea/Tovector', columns=['裁判書ID', '法院名稱', '裁判日期', '原始內容', '刑期(天)'], filters=[('刑期(天)', '>', 0)])
 except Exception as e:
     print(f"❌ 無法讀取數據文件: {e}")
     exit()
@@ -18,22 +20,26 @@ print(f"過濾後數據量: {len(df_with_sentence)} 行")
 
 # 載入文本嵌入模型
 try:
-    model = SentenceTransformer('DMetaSoul/sbert-chinese-general-v2')
+    model = load_model('DMetaSoul/sbert-chinese-general-v2')
 except Exception as e:
     print(f"❌ 無法載入模型: {e}")
     exit()
 
+# 向量快取：同一段原始內容只送進模型一次，再次執行時直接讀取 embedding_cache/
+embeddings = EmbeddingCache(model, 'DMetaSoul/sbert-chinese-general-v2')
+
 # 處理文本向量
 try:
-    text_embeddings = model.encode(df_with_sentence["原始內容"].tolist()).astype('float32')
+    text_embeddings = embeddings.encode(df_with_sentence["原始內容"].tolist())
 except Exception as e:
     print(f"❌ 文本向量化失敗: {e}")
     exit()
 
 # 將數據集分割為訓練集和測試集
 train_df, test_df = train_test_split(df_with_sentence, test_size=0.2, random_state=42)
-train_embeddings = model.encode(train_df["原始內容"].tolist()).astype('float32')
-test_embeddings = model.encode(test_df["原始內容"].tolist()).astype('float32')
+train_embeddings = embeddings.encode(train_df["原始內容"].tolist())
+test_embeddings = embeddings.encode(test_df["原始內容"].tolist())
+print(f"📋 向量快取：{embeddings.report()}")
 
 # 設置 K-Means 參數
 ncentroids = max(2, len(train_df) // 20)  # 增加聚類數量
@@ -44,25 +50,12 @@ print(f"聚類數量 (ncentroids): {ncentroids}")
 # 獲取嵌入維度
 d = train_embeddings.shape[1]
 
-# 創建量化器 (quantizer)
-quantizer = faiss.IndexFlatL2(d)
-
-# 創建使用 K-Means 聚類的 IndexIVFFlat 索引
-index = faiss.IndexIVFFlat(quantizer, d, ncentroids, faiss.METRIC_L2)
-
-# 訓練 K-Means 模型生成聚類質心
-assert not index.is_trained
-index.train(train_embeddings)
-assert index.is_trained
-
-# 將訓練數據添加到索引
-index.add(train_embeddings)
-
-# 保存索引
-faiss.write_index(index, "court_index_ivf.faiss")
+# 建立索引資料夾 court_index_ivf/：倒排表存判決 ID，判例的刑期、法院、日期與摘要存在 meta.sqlite；
+# 訓練資料與模型都沒變時直接沿用，不重新訓練
+bundle = build_bundle(train_df, train_embeddings, embeddings, "court_index_ivf", ncentroids=ncentroids)
 
 # 刑期預測系統
-def legal_consult_system(index, train_df, model):
+def legal_consult_system(index, bundle, model):
     print("\n== 智能刑期評估系統（使用 K-Means 聚類）==")
     while True:
         text = input("\n描述案情（輸入exit退出）: ")
@@ -79,34 +72,41 @@ def legal_consult_system(index, train_df, model):
             # 執行搜索，找最相似的 5 個案例
             k = 5
             distances, indices = index.search(text_vec, k=k)
+            # 搜尋結果是判決 ID；不足 k 筆的 -1 與沒有判例資料的 ID 略過，距離只留下對得上的判例
+            cases, distances = bundle.matched(distances[0], indices[0])
+            if cases.empty:
+                print("⚠️ 找不到相似判例")
+                continue
             
             # 顯示結果
             print("\n★ 相似判例分析:")
-            weights = 1 / (1 + distances[0])  # 根據距離計算權重
+            weights = 1 / (1 + distances)  # 根據距離計算權重
             weights /= weights.sum()  # 歸一化權重
-            for i, idx in enumerate(indices[0]):
-                case = train_df.iloc[idx]
-                similarity = 1 / (1 + distances[0][i])
+            for i, (_, case) in enumerate(cases.iterrows()):
+                similarity = 1 / (1 + distances[i])
                 print(f"\n・{case['原始內容'][:50]}...")
                 print(f"  實際刑期：{case['刑期(天)']}天 | 相似度：{similarity:.2%}")
             
             # 計算加權平均刑期
-            similar_sentences = train_df.iloc[indices[0]]["刑期(天)"]
+            similar_sentences = cases["刑期(天)"]
             weighted_average_sentence = np.average(similar_sentences, weights=weights)
             print(f"\n基於相似判例，加權預估刑期為: {weighted_average_sentence:.2f} 天")
         except Exception as e:
             print(f"❌ 輸入錯誤: {e}，請重新輸入")
 
 # 計算多種評估指標
-def calculate_metrics(index, test_df, train_df, model):
+def calculate_metrics(index, test_df, bundle, model):
     predictions = []
     actuals = []
     for idx, row in test_df.iterrows():
         text_vec = model.encode([row["原始內容"]]).astype('float32')
         distances, indices = index.search(text_vec, k=5)  # 增加 k
-        weights = 1 / (1 + distances[0])
+        cases, distances = bundle.matched(distances[0], indices[0])
+        if cases.empty:  # 沒有對得上的判例，無法預估，不列入評估
+            continue
+        weights = 1 / (1 + distances)
         weights /= weights.sum()
-        similar_sentences = train_df.iloc[indices[0]]["刑期(天)"]
+        similar_sentences = cases["刑期(天)"]
         predicted_sentence = np.average(similar_sentences, weights=weights)
         predictions.append(predicted_sentence)
         actuals.append(row["刑期(天)"])
@@ -126,15 +126,10 @@ def calculate_metrics(index, test_df, train_df, model):
     if r2 < 0:
         print("⚠️ R² 為負數，模型預測效果比簡單均值預測還差！")
 
-# 載入索引
-try:
-    index = faiss.read_index("court_index_ivf.faiss")
-except Exception as e:
-    print(f"❌ 請先創建索引，錯誤: {e}")
-    exit()
+index = bundle.index
 
 # 啟動系統
-legal_consult_system(index, train_df, model)
+legal_consult_system(index, bundle, model)
 
 # 計算並顯示評估指標
-calculate_metrics(index, test_df, train_df, model)
\ No newline at end of file
+calculate_metrics(index, test_df, bundle, embeddings)
\ No newline at end of file
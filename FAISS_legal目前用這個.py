@@ -1,13 +1,15 @@
-import faiss
 import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+from case_dataset import load_dataset
+from embedding_cache import EmbeddingCache
+from embedding_server import load_model
+from index_bundle import build_bundle
 # 連家妮犯三人以上共同詐欺取財罪，共二罪，測試用
 # 讀取數據
 try:
-    df = pd.read_csv('C:/Users/李/Desktop/數據分析/outputarea/Tovector.csv')
+    df = load_dataset('C:/Users/李/Desktop/數據分析/outputarea/Tovector', columns=['裁判書ID', '法院名稱', '裁判日期', '原始內容', '刑期(天)'], filters=[('刑期(天)', '>', 0)])
 except Exception as e:
     print(f"❌ 無法讀取數據文件: {e}")
     exit()
@@ -19,23 +21,27 @@ print(f"過濾後數據量: {len(df_with_sentence)} 行")
 
 # 載入原始嵌入模型
 try:
-    model = SentenceTransformer('DMetaSoul/sbert-chinese-general-v2')
+    model = load_model('DMetaSoul/sbert-chinese-general-v2')
     print("✅ 已載入通用模型：DMetaSoul/sbert-chinese-general-v2")
 except Exception as e:
     print(f"❌ 無法載入模型: {e}")
     exit()
 
+# 向量快取：同一段原始內容只送進模型一次，再次執行時直接讀取 embedding_cache/
+embeddings = EmbeddingCache(model, 'DMetaSoul/sbert-chinese-general-v2')
+
 # 處理文本向量
 try:
-    text_embeddings = model.encode(df_with_sentence["原始內容"].tolist()).astype('float32')
+    text_embeddings = embeddings.encode(df_with_sentence["原始內容"].tolist())
 except Exception as e:
     print(f"❌ 文本向量化失敗: {e}")
     exit()
 
 # 將數據集分割為訓練集和測試集
 train_df, test_df = train_test_split(df_with_sentence, test_size=0.2, random_state=42)
-train_embeddings = model.encode(train_df["原始內容"].tolist()).astype('float32')
-test_embeddings = model.encode(test_df["原始內容"].tolist()).astype('float32')
+train_embeddings = embeddings.encode(train_df["原始內容"].tolist())
+test_embeddings = embeddings.encode(test_df["原始內容"].tolist())
+print(f"📋 向量快取：{embeddings.report()}")
 
 # 設置 K-Means 參數
 ncentroids = max(2, len(train_df) // 20)  
@@ -47,25 +53,12 @@ print(f"聚類數量 (ncentroids): {ncentroids}")
 d = train_embeddings.shape[1]
 print(f"維度數量{d}")
 
-# 創建量化器 (quantizer)
-quantizer = faiss.IndexFlatL2(d) # 使用 歐式距離 度量
-
-# 創建使用 K-Means 聚類的 IndexIVFFlat 索引
-index = faiss.IndexIVFFlat(quantizer, d, ncentroids, faiss.METRIC_L2)
-
-# 訓練 K-Means 模型生成聚類質心
-assert not index.is_trained
-index.train(train_embeddings)
-assert index.is_trained
-
-# 將訓練數據添加到索引
-index.add(train_embeddings)
-
-# 保存索引
-faiss.write_index(index, "court_index_ivf_optimized.faiss")
+# 建立索引資料夾 court_index_ivf_optimized/：倒排表存判決 ID，判例的刑期、法院、日期與摘要存在 meta.sqlite；
+# 訓練資料與模型都沒變時直接沿用，不重新訓練
+bundle = build_bundle(train_df, train_embeddings, embeddings, "court_index_ivf_optimized", ncentroids=ncentroids)
 
 # 刑期預測系統
-def legal_consult_system(index, train_df, model):
+def legal_consult_system(index, bundle, model):
     print("\n== 智能刑期評估系統（使用 K-Means 聚類與優化參數）==")
     while True:
         text = input("\n描述案情（輸入exit退出）: ")
@@ -77,23 +70,27 @@ def legal_consult_system(index, train_df, model):
             index.nprobe = 75  # 最近鄰的k個質心
             k = 7  # 調整 k 到 7
             distances, indices = index.search(text_vec, k=k)
+            # 搜尋結果是判決 ID；不足 k 筆的 -1 與沒有判例資料的 ID 略過，距離只留下對得上的判例
+            cases, distances = bundle.matched(distances[0], indices[0])
+            if cases.empty:
+                print("⚠️ 找不到相似判例")
+                continue
             
             print("\n★ 相似判例分析:")
-            weights = np.exp(-distances[0])  # 使用指數衰減權重
+            weights = np.exp(-distances)  # 使用指數衰減權重
             # 檢查權重是否有效
             if not np.isfinite(weights).all() or weights.sum() == 0:
                 print("⚠️ 權重計算異常，使用均勻權重")
-                weights = np.ones_like(distances[0]) / len(distances[0])
+                weights = np.ones_like(distances) / len(distances)
             else:
                 weights /= weights.sum()  # 歸一化權重
             
-            for i, idx in enumerate(indices[0]):
-                case = train_df.iloc[idx]
-                similarity = 1 / (1 + distances[0][i])
+            for i, (_, case) in enumerate(cases.iterrows()):
+                similarity = 1 / (1 + distances[i])
                 print(f"\n・{case['原始內容'][:50]}...")
                 print(f"  實際刑期：{case['刑期(天)']}天 | 相似度：{similarity:.2%}")
             
-            similar_sentences = train_df.iloc[indices[0]]['刑期(天)']
+            similar_sentences = cases['刑期(天)']
             # 檢查刑期數據是否有效
             if not np.isfinite(similar_sentences).all():
                 print("⚠️ 相似案例刑期數據中包含無效值，無法計算預估刑期")
@@ -109,20 +106,21 @@ def legal_consult_system(index, train_df, model):
             print(f"❌ 輸入錯誤: {e}，請重新輸入")
 
 # 計算多種評估指標
-def calculate_metrics(index, test_df, train_df, model):
+def calculate_metrics(index, test_df, bundle, model):
     predictions = []
     actuals = []
     for idx, row in test_df.iterrows():
         text_vec = model.encode([row["原始內容"]]).astype('float32')
         distances, indices = index.search(text_vec, k=7)  # k=7
-        weights = np.exp(-distances[0])  # 使用指數衰減權重
+        cases, distances = bundle.matched(distances[0], indices[0])
+        weights = np.exp(-distances)  # 使用指數衰減權重
         if not np.isfinite(weights).all() or weights.sum() == 0:
-            weights = np.ones_like(distances[0]) / len(distances[0])
+            weights = np.ones_like(distances) / max(1, len(distances))
         else:
             weights /= weights.sum()
         
-        similar_sentences = train_df.iloc[indices[0]]['刑期(天)']
-        if not np.isfinite(similar_sentences).all():
+        similar_sentences = cases['刑期(天)']
+        if cases.empty or not np.isfinite(similar_sentences).all():  # 沒有對得上的判例時同樣無法預估
             predicted_sentence = np.nan
         else:
             predicted_sentence = np.average(similar_sentences, weights=weights)
@@ -154,15 +152,10 @@ def calculate_metrics(index, test_df, train_df, model):
     else:
         print(f"🎉 R² 為正數，模型已能捕捉 {r2*100:.1f}% 的刑期變異性！")
 
-# 載入索引
-try:
-    index = faiss.read_index("court_index_ivf_optimized.faiss")
-except Exception as e:
-    print(f"❌ 請先創建索引，錯誤: {e}")
-    exit()
+index = bundle.index
 
 # 啟動系統
-legal_consult_system(index, train_df, model)
+legal_consult_system(index, bundle, model)
 
 # 計算並顯示評估指標
-calculate_metrics(index, test_df, train_df, model)
\ No newline at end of file
+calculate_metrics(index, test_df, bundle, embeddings)
\ No newline at end of file
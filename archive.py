@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # 沒有 zstandard 時退回標準庫的 zlib
+    zstandard = None
+
+# 裁判書原始 HTML 的壓縮封存格式：
+#   archive.json        壓縮方式等設定
+#   dict.bin            以網站共用版面訓練出的壓縮字典
+#   shard_{w}_{n}.dat   只追加的分片，每份文件獨立壓縮後接續寫入
+#   shard_{w}_{n}.idx   分片的位移索引，每行：裁判書ID、內容雜湊、資料分片、位移、長度、是否用字典
+# 不同寫入者（例如多個瀏覽器程序）使用各自的 w，互不干擾；同內容只存一次
+SHARD_SIZE = 256 * 1024 * 1024  # 單一分片上限
+DICT_SIZE = 112 * 1024  # zstd 字典大小
+ZLIB_DICT_SIZE = 32 * 1024  # zlib 視窗大小即字典上限
+AUTO_TRAIN_SAMPLES = 50  # 尚無字典時，累積這麼多份文件後自動訓練
+
+
+def train_zlib_dictionary(samples, size=ZLIB_DICT_SIZE):
+    """挑出多數樣本共有的行組成 zlib 字典，最常見的放在最後（距離最近、壓縮效果最好）"""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(sample.splitlines(keepends=True)))
+    threshold = max(2, len(samples) // 2)
+    common = [line for line, n in counts.most_common() if n >= threshold and len(line.strip()) > 8]
+    chunks = []
+    total = 0
+    for line in common:
+        if total + len(line) > size:
+            break
+        chunks.append(line)
+        total += len(line)
+    return "".join(reversed(chunks))
+
+
+class JudgmentArchive:
+    """裁判書封存庫：依裁判書 ID 隨機讀取單一文件，或以迭代器依寫入順序讀出全部"""
+
+    def __init__(self, path, writer="0", shard_size=SHARD_SIZE, auto_train=AUTO_TRAIN_SAMPLES):
+        self.path = path
+        self.writer = writer
+        self.shard_size = shard_size
+        # 每個寫入者都可自動訓練；dict.bin 只會建立一次（見 train_dictionary），所有寫入者共用
+        self.auto_train = auto_train
+        self._samples = []
+        os.makedirs(path, exist_ok=True)
+        config_path = os.path.join(path, "archive.json")
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                self.config = json.load(f)
+        else:
+            self.config = {"codec": "zstd" if zstandard else "zlib"}
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(self.config, f)
+        if self.config["codec"] == "zstd" and zstandard is None:
+            raise RuntimeError("此封存庫使用 zstd 壓縮，請先安裝 zstandard")
+        self.dictionary = self._load_dictionary()
+        self.index = {}  # 裁判書ID -> (內容雜湊, 分片, 位移, 長度, 是否用字典)
+        self.by_hash = {}  # 內容雜湊 -> (分片, 位移, 長度, 是否用字典)
+        self.order = []  # 依寫入順序的裁判書ID
+        self._load_index()
+        self._handles = {}
+        self._shard = None
+        self._data = None
+        self._idx = None
+
+    def _load_dictionary(self):
+        dict_path = os.path.join(self.path, "dict.bin")
+        if not os.path.exists(dict_path):
+            return None
+        with open(dict_path, "rb") as f:
+            return f.read()
+
+    def _load_index(self):
+        for name in sorted(f for f in os.listdir(self.path) if f.endswith(".idx")):
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 6:  # 寫到一半中斷的行
+                        continue
+                    jid, digest, shard, offset, length, with_dict = parts
+                    entry = (digest, shard, int(offset), int(length), with_dict == "1")
+                    if jid not in self.index:
+                        self.order.append(jid)
+                    self.index[jid] = entry
+                    self.by_hash[digest] = entry[1:]
+
+    def train_dictionary(self, samples):
+        """以樣本文件訓練壓縮字典；字典只能建立一次，之後寫入的文件都會使用。
+        多個寫入者同時訓練時，先完成的字典生效，其餘改用它"""
+        if self.dictionary is not None:
+            return self.dictionary
+        self.dictionary = self._load_dictionary()
+        if self.dictionary is not None:
+            return self.dictionary
+        samples = [s if isinstance(s, str) else s.decode("utf-8") for s in samples]
+        if self.config["codec"] == "zstd":
+            trained = zstandard.train_dictionary(DICT_SIZE, [s.encode("utf-8") for s in samples])
+            self.dictionary = trained.as_bytes()
+        else:
+            self.dictionary = train_zlib_dictionary(samples).encode("utf-8")
+        # 先寫到暫存檔再以硬連結建立 dict.bin：已存在時連結失敗，不會蓋掉別人的字典，也不會讀到寫一半的檔案
+        dict_path = os.path.join(self.path, "dict.bin")
+        temp_path = os.path.join(self.path, f"dict.bin.{self.writer}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(self.dictionary)
+        try:
+            os.link(temp_path, dict_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+        self.dictionary = self._load_dictionary()
+        return self.dictionary
+
+    def _compress(self, data, with_dict):
+        if self.config["codec"] == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if with_dict else None
+            return zstandard.ZstdCompressor(level=10, dict_data=dict_data).compress(data)
+        compressor = zlib.compressobj(9, zdict=self.dictionary) if with_dict else zlib.compressobj(9)
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, blob, with_dict):
+        if self.config["codec"] == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if with_dict else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(blob)
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if with_dict else zlib.decompressobj()
+        return decompressor.decompress(blob) + decompressor.flush()
+
+    def _open_shard(self):
+        """找到本寫入者目前可追加的分片，超過大小上限就開新的"""
+        pattern = re.compile(rf"shard_{re.escape(self.writer)}_(\d+)\.dat")
+        numbers = [int(m.group(1)) for m in map(pattern.fullmatch, os.listdir(self.path)) if m]
+        number = max(numbers, default=0)
+        name = f"shard_{self.writer}_{number:05d}"
+        if os.path.exists(os.path.join(self.path, name + ".dat")) and \
+                os.path.getsize(os.path.join(self.path, name + ".dat")) >= self.shard_size:
+            name = f"shard_{self.writer}_{number + 1:05d}"
+        self._shard = name
+        self._data = open(os.path.join(self.path, name + ".dat"), "ab")
+        self._idx = open(os.path.join(self.path, name + ".idx"), "a", encoding="utf-8")
+
+    def put(self, jid, document):
+        """寫入一份文件；同一ID內容不變時略過，內容相同的文件只存一次"""
+        data = document.encode("utf-8") if isinstance(document, str) else document
+        digest = hashlib.sha1(data).hexdigest()
+        if jid in self.index and self.index[jid][0] == digest:
+            return False
+        if self.dictionary is None and self.auto_train:
+            self.dictionary = self._load_dictionary()  # 其他寫入者可能已訓練好
+        if self.dictionary is None and self.auto_train:
+            self._samples.append(data)
+            if len(self._samples) >= self.auto_train:
+                self.train_dictionary(self._samples)
+                self._samples = []
+        if digest in self.by_hash:
+            shard, offset, length, with_dict = self.by_hash[digest]
+        else:
+            if self._data is None or self._data.tell() >= self.shard_size:
+                self.close()
+                self._open_shard()
+            with_dict = self.dictionary is not None
+            blob = self._compress(data, with_dict)
+            shard = self._shard
+            offset = self._data.tell()
+            length = len(blob)
+            self._data.write(blob)
+            self._data.flush()
+            self.by_hash[digest] = (shard, offset, length, with_dict)
+        if self._idx is None:
+            self._open_shard()
+        self._idx.write(f"{jid}\t{digest}\t{shard}\t{offset}\t{length}\t{int(with_dict)}\n")
+        self._idx.flush()
+        if jid not in self.index:
+            self.order.append(jid)
+        self.index[jid] = (digest, shard, offset, length, with_dict)
+        return True
+
+    def get(self, jid):
+        """依裁判書 ID 讀出單一文件（只解壓這一份）"""
+        _, shard, offset, length, with_dict = self.index[jid]
+        handle = self._handles.get(shard)
+        if handle is None:
+            if self._data is not None:
+                self._data.flush()
+            handle = self._handles[shard] = open(os.path.join(self.path, shard + ".dat"), "rb")
+        handle.seek(offset)
+        return self._decompress(handle.read(length), with_dict).decode("utf-8")
+
+    def __contains__(self, jid):
+        return jid in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.order)
+
+    def iter_documents(self):
+        """依寫入順序逐一產生 (裁判書ID, 文件內容)"""
+        for jid in self.order:
+            yield jid, self.get(jid)
+
+    def close(self):
+        for handle in (self._data, self._idx, *self._handles.values()):
+            if handle is not None:
+                handle.close()
+        self._data = self._idx = None
+        self._handles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def judgment_id_from_html(html):
+    """從詳細頁的表單網址取出裁判書 ID，找不到時回傳 None"""
+    from frontier import judgment_id_from_url
+
+    match = re.search(r'action="\./data\.aspx\?([^"]+)"', html)
+    if not match:
+        return None
+    return judgment_id_from_url("data.aspx?" + match.group(1).replace("&amp;", "&"))
+
+
+def import_html_files(archive, input_dir, sample_size=50):
+    """把既有的 case_*_detail.html 匯入封存庫；字典尚未建立時先以前幾份訓練"""
+    names = sorted(
+        (f for f in os.listdir(input_dir) if re.fullmatch(r"case_\d+_detail\.html", f)),
+        key=lambda f: int(re.search(r"\d+", f).group()),
+    )
+    if archive.dictionary is None:
+        samples = []
+        for name in names[:sample_size]:
+            with open(os.path.join(input_dir, name), "r", encoding="utf-8") as f:
+                samples.append(f.read())
+        archive.train_dictionary(samples)
+    added = 0
+    for name in names:
+        with open(os.path.join(input_dir, name), "r", encoding="utf-8") as f:
+            html = f.read()
+        jid = judgment_id_from_html(html) or name[:-len("_detail.html")]
+        if archive.put(jid, html):
+            added += 1
+    return added
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="裁判書 HTML 封存庫")
+    parser.add_argument("archive", help="封存庫資料夾")
+    parser.add_argument("--import-dir", help="匯入此資料夾中的 case_*_detail.html")
+    args = parser.parse_args()
+
+    with JudgmentArchive(args.archive) as archive:
+        if args.import_dir:
+            started = time.perf_counter()
+            added = import_html_files(archive, args.import_dir)
+            print(f"✅ 匯入 {added} 份文件，耗時 {time.perf_counter() - started:.2f} 秒")
+        raw = sum(len(doc.encode("utf-8")) for _, doc in archive.iter_documents())
+        stored = sum(os.path.getsize(os.path.join(args.archive, f)) for f in os.listdir(args.archive) if f.endswith(".dat"))
+        print(f"共 {len(archive)} 份文件，原始 {raw / 1e6:.1f} MB，壓縮後 {stored / 1e6:.1f} MB（{raw / max(stored, 1):.1f}x）")
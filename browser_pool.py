@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from archive import JudgmentArchive
+from compact_record import DETAIL_READY, store_page
+from frontier import Frontier, FETCHED, DEFAULT_PATH, judgment_id_from_url
+
+# 平行瀏覽器工作池：N 個無頭瀏覽器各自負責一段不重疊的結果列表頁，
+# 共同寫入同一個爬取佇列與輸出資料夾；協調者在某個工作程序崩潰時重派其未完成的頁
+DEFAULT_WORKERS = 4
+MAX_RESTARTS = 3  # 每段頁碼最多重派次數
+
+
+def build_options(use_tor=True):
+    """無頭 Chrome 設定，預設走 Tor 的 SOCKS5 代理"""
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    if use_tor:
+        options.add_argument('--proxy-server=socks5://127.0.0.1:9050')
+    return options
+
+
+def result_page_url(list_url, page):
+    """把結果列表網址的 page 參數換成指定頁碼"""
+    parsed = urlparse(list_url)
+    query = parse_qs(parsed.query)
+    query["page"] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def split_pages(pages, workers):
+    """把頁碼切成 workers 段連續且不重疊的區間"""
+    size, extra = divmod(len(pages), workers)
+    chunks = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(pages[start:end])
+        start = end
+    return chunks
+
+
+def browser_worker(worker_id, pages, list_url, frontier_path, out_dir=".", cookies=None, use_tor=True,
+                   archive_dir=None, compact=False, keep_html=False):
+    """單一瀏覽器工作程序：依序處理分配到的結果頁，收集連結並下載尚未抓取的詳細頁"""
+    from spiderr import create_driver
+
+    frontier = Frontier(frontier_path)
+    # 每個程序寫入自己的封存分片，避免多程序同時追加同一個檔案
+    archive = JudgmentArchive(archive_dir, writer=f"w{worker_id}") if archive_dir else None
+    driver = create_driver(build_options(use_tor))
+    try:
+        if cookies:
+            driver.get(list_url)
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+        for page in pages:
+            driver.get(result_page_url(list_url, page))
+            links = WebDriverWait(driver, 30).until(
+                EC.presence_of_all_elements_located((By.CLASS_NAME, "hlTitle_scroll"))
+            )
+            hrefs = [link.get_attribute("href") for link in links]
+            frontier.add(hrefs)
+            for href in hrefs:
+                if frontier.state(href) == FETCHED:
+                    continue
+                case_no = frontier.case_no(href)
+                driver.get(href)
+                try:
+                    WebDriverWait(driver, 20).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, DETAIL_READY))
+                    )
+                except TimeoutException as e:
+                    # 單筆逾時只記錄失敗；瀏覽器本身出錯則讓程序結束，由協調者重派
+                    frontier.mark_failed(href, e)
+                    continue
+                store_page(driver.page_source, judgment_id_from_url(href) or href, case_no, out_dir, archive,
+                           compact, keep_html)
+                frontier.mark_fetched(href)
+            frontier.mark_page_done(page, worker_id)
+            print(f"[工作程序 {worker_id}] 第 {page} 頁完成，{len(hrefs)} 筆")
+    finally:
+        driver.quit()
+        frontier.close()
+        if archive is not None:
+            archive.close()
+
+
+def run_pool(list_url, total_pages, workers=DEFAULT_WORKERS, frontier_path=DEFAULT_PATH, out_dir=".",
+             cookies=None, use_tor=True, max_restarts=MAX_RESTARTS, archive_dir=None, compact=False,
+             keep_html=False):
+    """協調者：分派頁碼給各瀏覽器程序，程序崩潰時把其未完成的頁重新派給新程序"""
+    os.makedirs(out_dir, exist_ok=True)
+    frontier = Frontier(frontier_path)
+    done = frontier.done_pages()
+    todo = [page for page in range(1, total_pages + 1) if page not in done]
+    print(f"共 {total_pages} 頁，已完成 {len(done)} 頁，待處理 {len(todo)} 頁，工作程序 {workers} 個")
+
+    ctx = multiprocessing.get_context("spawn")
+
+    def start(worker_id, pages):
+        process = ctx.Process(
+            target=browser_worker,
+            args=(worker_id, pages, list_url, frontier_path, out_dir, cookies, use_tor, archive_dir, compact,
+                  keep_html),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    started = time.perf_counter()
+    running = {}
+    for worker_id, pages in enumerate(split_pages(todo, workers)):
+        running[worker_id] = (start(worker_id, pages), pages, 0)
+
+    while running:
+        wait([process.sentinel for process, _, _ in running.values()])
+        for worker_id, (process, pages, restarts) in list(running.items()):
+            if process.is_alive():
+                continue
+            del running[worker_id]
+            done = frontier.done_pages()
+            remaining = [page for page in pages if page not in done]
+            if not remaining:
+                continue
+            if restarts >= max_restarts:
+                print(f"❌ 工作程序 {worker_id} 已重派 {restarts} 次仍失敗，放棄頁碼 {remaining}")
+                continue
+            print(f"⚠️ 工作程序 {worker_id} 異常結束（exitcode={process.exitcode}），重派 {len(remaining)} 頁")
+            running[worker_id] = (start(worker_id, remaining), remaining, restarts + 1)
+
+    elapsed = time.perf_counter() - started
+    finished = len(frontier.done_pages())
+    print(f"📂 完成 {finished}/{total_pages} 頁，耗時 {elapsed:.1f} 秒，佇列狀態: {frontier.counts()}")
+    frontier.close()
+    return finished
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="以多個無頭瀏覽器平行抓取結果列表與詳細頁")
+    parser.add_argument("list_url", nargs="?", help="搜尋結果列表網址（iframe-data 的 src）")
+    parser.add_argument("--pages", type=int, help="結果列表總頁數")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--out", default=".", help="輸出資料夾")
+    parser.add_argument("--frontier", default=DEFAULT_PATH)
+    parser.add_argument("--archive", help="寫入此封存庫資料夾，而非個別 HTML 檔")
+    parser.add_argument("--local", action="store_true", help="對本地替身網站測試（不走 Tor）")
+    args = parser.parse_args()
+
+    if args.local:
+        from fetcher import serve_local_cases
+
+        server, list_url = serve_local_cases(".")
+        out_dir = tempfile.mkdtemp(prefix="pool_local_")
+        case_count = len([f for f in os.listdir(".") if f.startswith("case_") and f.endswith("_detail.html")])
+        try:
+            run_pool(list_url, args.pages or -(-case_count // 20), args.workers,
+                     os.path.join(out_dir, "frontier.sqlite"), out_dir, use_tor=False)
+        finally:
+            server.shutdown()
+        print(f"本地測試輸出於 {out_dir}")
+    elif args.list_url and args.pages:
+        run_pool(args.list_url, args.pages, args.workers, args.frontier, args.out, archive_dir=args.archive)
+    else:
+        parser.print_help()
@@ -0,0 +1,148 @@
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 沒有 pyarrow 時只能讀寫 CSV
+    pa = ds = pq = None
+
+# 正規化結果的交接格式：依法院與年份分區的 Parquet 資料集（outputarea/Tovector/法院名稱=…/年份=…/*.parquet）。
+# 下游只讀需要的欄位，並把法院、年份、刑期(天) 等條件交給 pyarrow 先略過不相關的分區與 row group
+DATASET_PATH = 'C:/Users/李/Desktop/數據分析/outputarea/Tovector'
+ORDER_COLUMN = '序號'  # 原本的列順序；分區後讀回時依此排序，train_test_split 等結果才會與 CSV 相同
+ROW_GROUP_ROWS = 64 * 1024
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([('法院名稱', pa.string()), ('年份', pa.int16())]), flavor='hive')
+
+
+def write_dataset(df, path=DATASET_PATH):
+    """寫成分區資料集：先寫到 path.partial，完成後才換掉舊的資料集"""
+    if pa is None:
+        raise RuntimeError("寫出 Parquet 資料集需要安裝 pyarrow")
+    df = df.copy()
+    df[ORDER_COLUMN] = range(len(df))
+    df['年份'] = pd.to_datetime(df['裁判日期']).dt.year.astype('int16')
+    df['法院名稱'] = df['法院名稱'].astype(str)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partial_path = path + '.partial'
+    shutil.rmtree(partial_path, ignore_errors=True)
+    ds.write_dataset(table, partial_path, format='parquet', partitioning=_partitioning(),
+                     basename_template='part-{i}.parquet', max_rows_per_group=ROW_GROUP_ROWS,
+                     min_rows_per_group=min(ROW_GROUP_ROWS, len(df)) or 1)
+    if os.path.exists(path):
+        old_path = path + '.old'
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(partial_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(partial_path, path)
+    return len(df)
+
+
+def _expression(filters, courts, years):
+    """filters 與 pandas.read_parquet 相同的寫法，例如 [('刑期(天)', '>', 0)]；courts、years 為分區條件"""
+    conditions = list(filters or [])
+    if courts is not None:
+        conditions.append(('法院名稱', 'in', list(courts)))
+    if years is not None:
+        conditions.append(('年份', 'in', [int(year) for year in years]))
+    return pq.filters_to_expression(conditions) if conditions else None
+
+
+def load_dataset(path=DATASET_PATH, columns=None, filters=None, courts=None, years=None):
+    """讀取資料集中指定的欄位與符合條件的列，列順序與原本的 Tovector.csv 相同；
+    沒有 pyarrow 或資料集不存在時，改讀同名的 CSV（path + '.csv'）並在讀入後篩選"""
+    if pa is None or not os.path.isdir(path):
+        return _load_csv(path + '.csv', columns, filters, courts, years)
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning())
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, ORDER_COLUMN]))
+    table = dataset.to_table(columns=read_columns, filter=_expression(filters, courts, years))
+    df = table.to_pandas().sort_values(ORDER_COLUMN, kind='stable', ignore_index=True)
+    if columns is None:
+        # 與 CSV 相同的欄位順序：分區欄位讀回時排在最後，序號與年份是寫入時才加的
+        metadata = dataset.schema.pandas_metadata or {}
+        names = [column['name'] for column in metadata.get('columns', []) if column['name'] in df.columns]
+        return df[names or list(df.columns)].drop(columns=[ORDER_COLUMN, '年份'], errors='ignore')
+    return df[list(columns)]
+
+
+_OPERATORS = {
+    '=': lambda s, v: s == v, '==': lambda s, v: s == v, '!=': lambda s, v: s != v,
+    '>': lambda s, v: s > v, '>=': lambda s, v: s >= v, '<': lambda s, v: s < v, '<=': lambda s, v: s <= v,
+    'in': lambda s, v: s.isin(v), 'not in': lambda s, v: ~s.isin(v),
+}
+
+
+def _load_csv(csv_path, columns, filters, courts, years):
+    conditions = list(filters or [])
+    needed = None
+    if columns is not None:
+        needed = set(columns) | {column for column, _, _ in conditions}
+        if courts is not None:
+            needed.add('法院名稱')
+        if years is not None:
+            needed.add('裁判日期')
+    df = pd.read_csv(csv_path, usecols=None if needed is None else lambda column: column in needed)
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in conditions:
+        mask &= _OPERATORS[op](df[column], value)
+    if courts is not None:
+        mask &= df['法院名稱'].isin(list(courts))
+    if years is not None:
+        mask &= pd.to_datetime(df['裁判日期']).dt.year.isin([int(year) for year in years])
+    df = df[mask].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+
+    # 以 Tovector.csv 複製到指定列數，比較整份 CSV 讀取與各下游實際需要的讀取方式
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'outputarea/Tovector.csv'
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    base = pd.read_csv(csv_path)
+    frame = pd.concat([base] * max(1, rows // len(base)), ignore_index=True)
+    folder = tempfile.mkdtemp(prefix='case_dataset_')
+    try:
+        path = os.path.join(folder, 'Tovector')
+        frame.to_csv(path + '.csv', index=False, encoding='utf-8-sig')
+        started = time.perf_counter()
+        write_dataset(frame, path)
+        print(f"📂 {len(frame)} 列，寫出資料集 {time.perf_counter() - started:.2f} 秒")
+        court = frame['法院名稱'].value_counts().index[0]
+        year = int(pd.to_datetime(frame['裁判日期']).dt.year.value_counts().index[0])
+        cases = [
+            ('整份 CSV（原本）', lambda: pd.read_csv(path + '.csv'), None),
+            ('FAISS：原始內容、刑期(天) > 0',
+             lambda: load_dataset(path, ['原始內容', '刑期(天)'], [('刑期(天)', '>', 0)]),
+             lambda df: df[df['刑期(天)'] > 0][['原始內容', '刑期(天)']]),
+            ('paint：刑期(天) > 0', lambda: load_dataset(path, ['刑期(天)'], [('刑期(天)', '>', 0)]),
+             lambda df: df[df['刑期(天)'] > 0][['刑期(天)']]),
+            (f'單一法院與年份（{court}，{year}）',
+             lambda: load_dataset(path, ['原始內容', '刑期(天)'], courts=[court], years=[year]),
+             lambda df: df[(df['法院名稱'] == court) & (pd.to_datetime(df['裁判日期']).dt.year == year)]
+             [['原始內容', '刑期(天)']]),
+        ]
+        full = None
+        for label, load, expected in cases:
+            started = time.perf_counter()
+            df = load()
+            elapsed = time.perf_counter() - started
+            if full is None:
+                full, same = df, ''
+            else:
+                want = expected(full).reset_index(drop=True)
+                same = '，結果相同' if df.astype(str).equals(want.astype(str)) else '，❌ 結果不同'
+            print(f"{label}：{elapsed:.2f} 秒，{len(df)} 列，"
+                  f"{df.memory_usage(deep=True).sum() / 1024 ** 2:.0f} MB{same}")
+    finally:
+        shutil.rmtree(folder)
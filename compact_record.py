@@ -0,0 +1,115 @@
+import json
+import os
+
+from bs4 import BeautifulSoup
+
+from archive import judgment_id_from_html
+
+# 擷取時只保留裁判書本體：ID、標題、基本資料表、PDF 連結、內文與附表，
+# 網站版面、script、style 一律捨棄；原始 HTML 可選擇保留
+
+# 瀏覽器判斷詳細頁已載入：新版頁面有 #jud，舊版只有 .htmlcontent／.text-pre／.int-table
+# （存檔的 412 頁中 189 頁沒有 #jud，只等 #jud 會把這些頁當成逾時）
+DETAIL_READY = "#jud, .htmlcontent, .text-pre, .int-table"
+
+
+def _cell_text(cell):
+    return cell.get_text(strip=True)
+
+
+def extract_tables(container):
+    """內文中的表格（附表）轉成 [[儲存格文字, ...], ...]，略過隱藏的儲存格"""
+    tables = []
+    for table in container.find_all("table"):
+        rows = []
+        for tr in table.find_all("tr"):
+            cells = [
+                _cell_text(cell) for cell in tr.find_all(["td", "th"])
+                if "display: none" not in (cell.get("style") or "")
+            ]
+            if any(cells):
+                rows.append(cells)
+        if rows:
+            tables.append(rows)
+    return tables
+
+
+def extract_body(soup):
+    """裁判書內文：新版頁面在 .htmlcontent（每個 div 一段），舊版在 .text-pre"""
+    content = soup.select_one(".htmlcontent")
+    if content is not None:
+        paragraphs = [child.get_text() for child in content.find_all("div", recursive=False)]
+        return "\n".join(paragraphs), extract_tables(content)
+    for pre in soup.select(".text-pre"):
+        text = pre.get_text()
+        if text.strip():
+            return text, []
+    return "", []
+
+
+def extract_record(html, keep_html=False):
+    """從完整詳細頁擷取精簡紀錄"""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.find("title")
+    int_table = soup.select_one(".int-table")
+    meta = []
+    if int_table is not None:
+        for row in int_table.find_all("div", class_="row", recursive=False):
+            th = row.find(class_="col-th")
+            td = row.find(class_="col-td")
+            if th is None:  # 沒有欄名的那一列是整份內文，另存於 body
+                continue
+            meta.append([th.text.strip(), td.text.strip() if td else ""])
+    pdf_link = soup.find("a", id="hlExportPDF")
+    body, tables = extract_body(soup)
+    record = {
+        "id": judgment_id_from_html(html),
+        "title": title.text.strip() if title else None,
+        "meta": meta,
+        "pdf_href": pdf_link["href"] if pdf_link and pdf_link.get("href") else None,
+        "body": body,
+        "tables": tables,
+    }
+    if keep_html:
+        record["html"] = html
+    return record
+
+
+def store_page(html, jid, case_no, out_dir=".", archive=None, compact=False, keep_html=False):
+    """爬蟲儲存詳細頁：compact 時只存精簡紀錄；有封存庫時寫入封存庫，否則寫成 case_{n}_detail 檔"""
+    content = dumps(extract_record(html, keep_html)) if compact else html
+    if archive is not None:
+        archive.put(jid, content)
+        return
+    extension = "json" if compact else "html"
+    with open(os.path.join(out_dir, f"case_{case_no}_detail.{extension}"), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(text):
+    return json.loads(text)
+
+
+def is_record(content):
+    """判斷內容是精簡紀錄（JSON）還是完整 HTML"""
+    return content.lstrip().startswith("{")
+
+
+if __name__ == "__main__":
+    import re
+    import sys
+
+    # 比較精簡紀錄與原始 HTML 的大小
+    input_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    raw = compact = 0
+    for name in os.listdir(input_dir):
+        if re.fullmatch(r"case_\d+_detail\.html", name):
+            with open(os.path.join(input_dir, name), "r", encoding="utf-8") as f:
+                html = f.read()
+            raw += len(html.encode("utf-8"))
+            compact += len(dumps(extract_record(html)).encode("utf-8"))
+    print(f"原始 HTML {raw / 1e6:.2f} MB，精簡紀錄 {compact / 1e6:.2f} MB（{raw / max(compact, 1):.1f}x）")
@@ -0,0 +1,171 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# 整份語料的批次編碼：依文字長度排序後分桶，同一批的文字長度相近，補齊（padding）浪費的計算最少；
+# 各桶分給多個 CPU 程序計算，最後依原本的順序放回
+MAX_SEQ_LENGTH = 256  # 超過的 token 由模型截斷
+BATCH_SIZE = 32
+BUCKETS_PER_TASK = 4  # 每次交給子程序的桶數，太少時程序間往返的成本變高
+
+
+def token_length(text, max_seq_length=MAX_SEQ_LENGTH):
+    """估計的 token 數：BERT 中文斷詞大致每個字一個 token，加上 [CLS]、[SEP]"""
+    length = len(normalize_text(text)) + 2
+    return min(length, max_seq_length) if max_seq_length else length
+
+
+def length_buckets(texts, batch_size=BATCH_SIZE, max_seq_length=MAX_SEQ_LENGTH):
+    """依估計長度排序，每 batch_size 段切成一桶，回傳各桶的原始位置（numpy 陣列）"""
+    lengths = np.fromiter((token_length(text, max_seq_length) for text in texts), dtype="int64", count=len(texts))
+    order = np.argsort(lengths, kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def load_sentence_transformer(model_name, max_seq_length=MAX_SEQ_LENGTH):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    if max_seq_length:
+        model.max_seq_length = max_seq_length
+    return model
+
+
+_worker_model = None
+
+
+def _init_worker(model_factory):
+    global _worker_model
+    # 每個子程序只用一個執行緒計算，避免多個程序各自開滿所有核心互相搶
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    _worker_model = model_factory()
+
+
+def _encode_buckets(buckets, batch_size):
+    return [np.asarray(_worker_model.encode(texts, batch_size=batch_size), dtype="float32") for texts in buckets]
+
+
+class CorpusEncoder:
+    """encode 的用法與 SentenceTransformer 相同，可交給 EmbeddingCache；
+    model_factory 為可 pickle 的無參數函式（例如 partial(load_sentence_transformer, 名稱)），每個程序各載入一次模型"""
+
+    def __init__(self, model_factory, workers=1, batch_size=BATCH_SIZE, max_seq_length=MAX_SEQ_LENGTH,
+                 version=None):
+        self.model_factory = model_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.version = version
+        self._model = None
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def encode(self, texts, bucket=True, **_):
+        """回傳與 texts 同順序的向量；bucket=False 時依原順序分批（比較用）"""
+        # 每桶大小固定用建構時的 batch_size；EmbeddingCache 傳入的 batch_size 是寫入快取的單位，不影響分桶
+        texts = [str(text) for text in texts]
+        batch_size = self.batch_size
+        if bucket:
+            buckets = length_buckets(texts, batch_size, self.max_seq_length)
+        else:
+            buckets = [np.arange(start, min(start + batch_size, len(texts))) for start in range(0, len(texts), batch_size)]
+        groups = [[[texts[i] for i in positions] for positions in buckets[start:start + BUCKETS_PER_TASK]]
+                  for start in range(0, len(buckets), BUCKETS_PER_TASK)]
+        if self.workers > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                 initargs=(self.model_factory,))
+            results = self._pool.map(partial(_encode_buckets, batch_size=batch_size), groups)
+        else:
+            if self._model is None:
+                self._model = self.model_factory()
+            results = ([np.asarray(self._model.encode(bucket_texts, batch_size=batch_size), dtype="float32")
+                        for bucket_texts in group] for group in groups)
+        output = None
+        for positions, vectors in zip(buckets, (vectors for group in results for vectors in group)):
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype="float32")
+            output[positions] = vectors
+        return output if output is not None else np.empty((0, 0), dtype="float32")
+
+
+def _tiny_encoder(dim, max_seq_length):
+    from embedding_server import TinyRandomEncoder
+
+    return TinyRandomEncoder(dim=dim, max_seq_length=max_seq_length)
+
+
+def benchmark(csv_path="outputarea/Tovector.csv", rows=4000, dim=256, worker_counts=(1, 4, 8)):
+    """以 TinyRandomEncoder（依批補齊計算）比較原順序分批與依長度分桶，以及 1、4、8 個程序的每秒列數"""
+    import pandas as pd
+
+    base = pd.read_csv(csv_path)["原始內容"].fillna("").tolist()
+    texts = (base * (rows // len(base) + 1))[:rows]
+    rng = np.random.default_rng(0)
+    texts = [texts[i] for i in rng.permutation(len(texts))]
+    factory = partial(_tiny_encoder, dim, MAX_SEQ_LENGTH)
+    print(f"📂 {len(texts)} 段文字，估計長度中位數 {np.median([token_length(t) for t in texts]):.0f}，"
+          f"上限 {MAX_SEQ_LENGTH}，本機 {os.cpu_count()} 核")
+    reference = None
+    cases = [("原順序分批", 1, False)] + [(f"依長度分桶，{n} 個程序", n, True) for n in worker_counts]
+    for label, workers, bucket in cases:
+        with CorpusEncoder(factory, workers=workers) as encoder:
+            if workers > 1:
+                encoder.encode(texts[:workers * BATCH_SIZE])  # 先啟動子程序並載入模型，不計入時間
+            started = time.perf_counter()
+            vectors = encoder.encode(texts, bucket=bucket)
+            elapsed = time.perf_counter() - started
+        same = "" if reference is None else ("，結果相同" if np.allclose(vectors, reference, atol=1e-5) else "，❌ 結果不同")
+        reference = vectors if reference is None else reference
+        print(f"{label}：{elapsed:.2f} 秒，{len(texts) / elapsed:.0f} 列/秒{same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="整份語料的批次編碼，結果寫入向量快取")
+    parser.add_argument("--model", default="DMetaSoul/sbert-chinese-general-v2")
+    parser.add_argument("--dataset", default="C:/Users/李/Desktop/數據分析/outputarea/Tovector",
+                        help="case_dataset 資料集路徑")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-seq-length", type=int, default=None,
+                        help="截斷長度；不指定時沿用模型設定，向量與各建模腳本的快取相同")
+    parser.add_argument("--benchmark", action="store_true", help="以小模型比較分桶與 1、4、8 個程序")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    else:
+        from case_dataset import load_dataset
+        from embedding_cache import EmbeddingCache, hub_version
+
+        # 模型版本只讀 config 取得（不在本程序建立模型），快取資料夾與各建模腳本相同；模型只在計算的程序中載入
+        factory = partial(load_sentence_transformer, args.model, args.max_seq_length)
+        version = hub_version(args.model)
+        if args.max_seq_length:  # 截斷長度不同，向量也不同，分開快取
+            version += f"+len{args.max_seq_length}"
+        texts = load_dataset(args.dataset, columns=["原始內容"])["原始內容"].fillna("").tolist()
+        started = time.perf_counter()
+        with CorpusEncoder(factory, args.workers, args.batch_size, args.max_seq_length, version) as encoder, \
+                EmbeddingCache(encoder, args.model, version, batch_size=4096) as cache:
+            cache.encode(texts)
+            print(f"✅ {cache.report()}，{time.perf_counter() - started:.1f} 秒")
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+# 文字向量的本地快取：每種模型（名稱與版本）一個資料夾，向量依序附加在 float32 原始檔
+# vectors.f32 中並以 memmap 讀取，index.sqlite 記錄文字雜湊對應的列號；
+# 同一段原始內容只會送進模型一次，之後的查詢直接從 memmap 取出
+DEFAULT_PATH = "embedding_cache"
+BATCH_SIZE = 64  # 每批送進模型的文字數，也是寫入快取的單位
+
+# 送進模型前的正規化，預設只處理斷行留下的空白：BERT 斷詞以空白切開，並在每個漢字前後補上空白，
+# 所以合併連續空白、刪除漢字旁的空白後斷詞結果不變，向量與原文完全相同，只是多了去重。
+# PDF 每行開頭的行號（「13 上訴駁回。」）要另外指定 strip_line_numbers 才去掉：這會改變模型輸入，
+# 啟用前先以 encoder_backends.knn_metrics 比較 MAE／R²。正規化方式是快取資料夾名稱的一部分，改了就重新計算
+NORMALIZATION = "ws1"
+LINE_NUMBER_NORMALIZATION = "norm1"  # 沿用舊版預設的名稱，既有的快取與索引仍可使用
+LINE_NUMBER = re.compile(r"^\d{1,3}\s+(?=\S)")
+WHITESPACE = re.compile(r"\s+")
+# 只有 BERT 會單獨切開的漢字旁的空白可以安全刪除；全形英數字旁的空白會影響斷詞，保留
+IDEOGRAPH = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+IDEOGRAPH_SPACE = re.compile(f"(?<=[{IDEOGRAPH}]) | (?=[{IDEOGRAPH}])")
+CJK = "\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef"
+CJK_SPACE = re.compile(f"(?<=[{CJK}]) | (?=[{CJK}])")
+
+
+def text_key(text):
+    return hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    """合併空白並刪除漢字旁的空白（斷詞結果不變），只差在空白的原始內容視為同一段"""
+    return IDEOGRAPH_SPACE.sub("", WHITESPACE.sub(" ", str(text)).strip())
+
+
+def strip_line_numbers(text):
+    """另外去掉開頭行號並刪除中日文標點、全形字旁的空白（舊版的預設正規化，會改變模型輸入）"""
+    text = WHITESPACE.sub(" ", str(text)).strip()
+    return CJK_SPACE.sub("", LINE_NUMBER.sub("", text))
+
+
+NORMALIZERS = {NORMALIZATION: normalize_text, LINE_NUMBER_NORMALIZATION: strip_line_numbers}
+
+
+def normalization_tag(normalize):
+    """正規化函式的名稱，記錄在快取資料夾與索引中；None 為 none（以原文比對）"""
+    if normalize is None:
+        return "none"
+    for tag, function in NORMALIZERS.items():
+        if function is normalize:
+            return tag
+    return normalize.__name__
+
+
+def token_differences(texts, tokenizer, normalize=normalize_text):
+    """以模型的 tokenizer 比對原文與正規化後的斷詞結果，回傳不同的段數（0 代表向量不受正規化影響）"""
+    return sum(tokenizer.tokenize(str(text)) != tokenizer.tokenize(normalize(text)) for text in texts)
+
+
+def model_version(model):
+    """SentenceTransformer 從 Hugging Face 下載時的 commit（向量服務的用戶端則由服務提供），取不到時為 unknown"""
+    if isinstance(getattr(model, "version", None), str):
+        return model.version
+    try:
+        return model[0].auto_model.config._commit_hash or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def hub_version(model_name):
+    """不建立模型，只讀 config.json 取得與 model_version 相同的 commit；取不到時為 unknown"""
+    try:
+        from transformers import AutoConfig
+
+        return AutoConfig.from_pretrained(model_name)._commit_hash or "unknown"
+    except Exception:
+        return "unknown"
+
+
+class EmbeddingCache:
+    """以文字雜湊定址的向量快取；encode 與 model.encode 用法相同，但文字先經 normalize 正規化，
+    只計算快取中沒有的相異文字，再把向量對回每一列（normalize=None 時以原文比對，
+    normalize=strip_line_numbers 時一併去掉行號）"""
+
+    def __init__(self, model, model_name, version=None, path=DEFAULT_PATH, batch_size=BATCH_SIZE,
+                 normalize=normalize_text):
+        self.model = model
+        self.model_name = model_name
+        self.version = version or model_version(model)
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.normalization = normalization_tag(normalize)
+        name = f"{model_name}@{self.version}" + (f"+{self.normalization}" if normalize else "")
+        self.directory = os.path.join(path, re.sub(r"[^\w.+-]+", "_", name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vector_path = os.path.join(self.directory, "vectors.f32")
+        self.conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=30)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS vectors (digest TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                              [("model", model_name), ("version", self.version)])
+        self.conn.commit()
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.dim = int(meta["dim"]) if "dim" in meta else None
+        # 啟動時一次載入雜湊與列號，查詢時不必逐筆查資料庫
+        self.index = dict(self.conn.execute("SELECT digest, row FROM vectors"))
+        self.forward_texts = 0  # 本次實際送進模型的文字數
+        self.requested_texts = 0  # 本次 encode 要求的列數
+        self.unique_texts = 0  # 其中正規化後相異的文字數（每次 encode 分別計算後加總）
+        self._vectors = None
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+        self._vectors = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, text):
+        return text_key(self.normalize(text) if self.normalize else text) in self.index
+
+    @property
+    def vectors(self):
+        """整個快取的唯讀 memmap（列數 × 維度）"""
+        if self._vectors is None:
+            rows = os.path.getsize(self.vector_path) // (self.dim * 4) if self.dim and os.path.exists(self.vector_path) else 0
+            if rows == 0:
+                return np.empty((0, self.dim or 0), dtype="float32")
+            self._vectors = np.memmap(self.vector_path, dtype="float32", mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def encode(self, texts):
+        """回傳 texts 的向量（float32，列數 × 維度）；快取中沒有的相異文字才分批送進模型"""
+        texts = list(texts)
+        # 原文相同的列只正規化與雜湊一次
+        canonical = {text: self.normalize(text) if self.normalize else str(text) for text in dict.fromkeys(texts)}
+        text_keys = {text: text_key(normalized) for text, normalized in canonical.items()}
+        keys = [text_keys[text] for text in texts]
+        missing = {}
+        for text, key in text_keys.items():
+            if key not in self.index and key not in missing:
+                missing[key] = canonical[text]
+        self.requested_texts += len(texts)
+        self.unique_texts += len(set(text_keys.values()))
+        if missing:
+            self._add(list(missing), list(missing.values()))
+        rows = np.fromiter((self.index[key] for key in keys), dtype="int64", count=len(keys))
+        return self.take(rows)
+
+    def report(self):
+        """去重比例與實際送進模型的文字數"""
+        if not self.requested_texts:
+            return "尚未編碼任何文字"
+        saved = 1 - self.unique_texts / self.requested_texts
+        return (f"要求 {self.requested_texts} 段，相異 {self.unique_texts} 段（去重 {saved:.1%}），"
+                f"送進模型 {self.forward_texts} 段")
+
+    def take(self, rows):
+        """依列號取出向量；列號連續時直接回傳 memmap 的切片（不複製），否則複製成一般陣列"""
+        if len(rows) == 0:
+            return np.empty((0, self.dim or 0), dtype="float32")
+        start = int(rows[0])
+        if int(rows[-1]) - start == len(rows) - 1 and (len(rows) == 1 or (np.diff(rows) == 1).all()):
+            return self.vectors[start:start + len(rows)]
+        return np.asarray(self.vectors[rows])
+
+    def _add(self, keys, texts):
+        for start in range(0, len(texts), self.batch_size):
+            batch = np.ascontiguousarray(
+                self.model.encode(texts[start:start + self.batch_size], batch_size=self.batch_size), dtype="float32")
+            self.forward_texts += len(batch)
+            if self.dim is None:
+                self.dim = batch.shape[1]
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            # 先寫向量再寫索引：中斷時最多留下沒有索引的向量，不會有指向不存在向量的列號；
+            # 新向量的列號依檔案長度計算，不依索引筆數
+            with open(self.vector_path, "ab") as f:
+                first_row = f.tell() // (self.dim * 4)
+                f.write(batch.tobytes())
+            rows = [(key, first_row + i) for i, key in enumerate(keys[start:start + len(batch)])]
+            self.conn.executemany("INSERT OR REPLACE INTO vectors (digest, row) VALUES (?, ?)", rows)
+            self.conn.commit()
+            self.index.update(rows)
+            self._vectors = None
+
+
+if __name__ == "__main__":
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    import pandas as pd
+
+    class _HashEncoder:
+        """代替 SentenceTransformer 的確定性編碼器（依文字雜湊產生向量），並計算送入的文字數"""
+
+        def __init__(self, dim=768):
+            self.dim = dim
+            self.calls = 0
+
+        def encode(self, texts, batch_size=32):
+            self.calls += len(texts)
+            seeds = [int(text_key(text)[:8], 16) for text in texts]
+            return np.stack([np.random.default_rng(seed).standard_normal(self.dim, dtype="float32") for seed in seeds])
+
+    # 模擬 FAISS.py 的流程：整份語料一次，再取訓練、測試子集與逐筆查詢；第二次執行應完全不經過模型
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "outputarea/Tovector.csv"
+    texts = pd.read_csv(csv_path)["原始內容"].fillna("").tolist()
+    cache_dir = tempfile.mkdtemp(prefix="embedding_cache_")
+    try:
+        results = []
+        for run in (1, 2):
+            model = _HashEncoder()
+            started = time.perf_counter()
+            with EmbeddingCache(model, "hash-encoder", version="1", path=cache_dir) as cache:
+                everything = cache.encode(texts)
+                train = cache.encode(texts[::2])
+                test = cache.encode(texts[1::2])
+                single = [cache.encode([text]) for text in texts[1::2][:50]]
+                zero_copy = all(np.shares_memory(vector, cache.vectors) for vector in single)
+                results.append((everything.copy(), train, test))
+            elapsed = time.perf_counter() - started
+            print(f"第 {run} 次：送進模型 {model.calls} 段，{elapsed:.2f} 秒，逐筆查詢為零複製切片：{zero_copy}")
+        # 每一列的向量都等於其正規化文字的向量，正規化後相同的列向量完全相同
+        expected = _HashEncoder().encode([normalize_text(text) for text in texts])
+        same = all(np.array_equal(a, b) for a, b in zip(results[0], results[1])) and np.array_equal(results[0][0], expected)
+        print("✅ 第二次不經過模型且向量相同" if same and model.calls == 0 else "❌ 快取驗證失敗")
+
+        # 去重效果：以原文比對與正規化後比對各需送進模型幾段（編碼時間與段數成正比）
+        for label, normalize in (("原文比對", None), ("正規化後比對", normalize_text), ("另去掉行號", strip_line_numbers)):
+            model = _HashEncoder()
+            with EmbeddingCache(model, "hash-encoder", version="dedup", path=cache_dir, normalize=normalize) as cache:
+                cache.encode(texts)
+                print(f"{label}：{cache.report()}")
+
+        # 預設的正規化不改變斷詞：有模型的 tokenizer 時逐段比對
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained("DMetaSoul/sbert-chinese-general-v2")
+        except Exception as e:
+            print(f"⚠️ 無法載入 tokenizer，略過斷詞比對：{e}")
+        else:
+            for label, normalize in (("正規化後比對", normalize_text), ("另去掉行號", strip_line_numbers)):
+                print(f"{label}：{token_differences(texts, tokenizer, normalize)} / {len(texts)} 段的斷詞結果與原文不同")
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,298 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+# 常駐的文字向量服務：模型只載入一次，各程式以 EmbeddingClient 經本機 HTTP 取得向量；
+# 同時到達的請求在延遲預算內合併成一批送進模型，再把結果分回各請求
+MODEL_NAME = 'DMetaSoul/sbert-chinese-general-v2'
+HOST = "127.0.0.1"
+PORT = 8765
+DEFAULT_URL = f"http://{HOST}:{PORT}"
+MAX_BATCH = 64  # 每批最多的文字數
+MAX_WAIT = 0.01  # 第一個請求到達後最多等待多久再送出（秒）
+LATENCY_WINDOW = 1000  # 延遲統計保留最近幾筆請求
+
+
+class TinyRandomEncoder:
+    """隨機初始化的小模型（字元嵌入 → 一層 tanh → 平均），介面與 SentenceTransformer.encode 相同，
+    不需下載模型即可測試服務。與 transformer 一樣把每批補齊到最長的文字再計算，
+    超過 max_seq_length 的字元截斷；overhead 模擬每次前向計算的固定成本（秒）"""
+
+    def __init__(self, dim=32, vocab=4096, seed=0, overhead=0.0, max_seq_length=None):
+        rng = np.random.default_rng(seed)
+        self.vocab = vocab
+        self.embedding = rng.standard_normal((vocab, dim), dtype="float32")
+        self.weight = rng.standard_normal((dim, dim), dtype="float32") / np.sqrt(dim)
+        self.overhead = overhead
+        self.max_seq_length = max_seq_length
+        self.name = f"tiny-random-{dim}-{seed}"
+        self.version = "1"
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.calls += 1
+        if self.overhead:
+            time.sleep(self.overhead)
+        ids = [[ord(char) % self.vocab for char in str(text)][:self.max_seq_length] or [0] for text in texts]
+        vectors = np.empty((len(ids), self.weight.shape[0]), dtype="float32")
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            padded = np.zeros((len(batch), max(map(len, batch))), dtype="int64")
+            mask = np.zeros(padded.shape, dtype="float32")
+            for i, row in enumerate(batch):
+                padded[i, :len(row)] = row
+                mask[i, :len(row)] = 1
+            hidden = np.tanh(self.embedding[padded] @ self.weight)
+            vectors[start:start + len(batch)] = (hidden * mask[..., None]).sum(axis=1) / mask.sum(axis=1, keepdims=True)
+        return vectors
+
+
+class MicroBatcher:
+    """把多個請求合併成一批呼叫 model.encode：湊滿 max_batch 段文字或第一個請求已等待 max_wait 秒就送出"""
+
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        """送出一個請求，回傳 Future，結果為 (len(texts), 維度) 的 float32 陣列"""
+        future = Future()
+        self.queue.put((list(texts), future, time.perf_counter()))
+        return future
+
+    def encode(self, texts):
+        return self.submit(texts).result()
+
+    def _run(self):
+        while True:
+            pending = [self.queue.get()]
+            size = len(pending[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._encode(pending)
+
+    def _encode(self, pending):
+        texts = [text for item in pending for text in item[0]]
+        try:
+            # 單一請求可能超過 max_batch（例如整份語料），送進模型的每批仍以 max_batch 為上限，避免記憶體暴增
+            vectors = np.asarray(self.model.encode(texts, batch_size=max(1, min(len(texts), self.max_batch))),
+                                 dtype="float32")
+        except Exception as e:
+            with self.lock:
+                self.errors += len(pending)
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        start = 0
+        for item_texts, future, submitted in pending:
+            future.set_result(vectors[start:start + len(item_texts)])
+            start += len(item_texts)
+        with self.lock:
+            self.requests += len(pending)
+            self.texts += len(texts)
+            self.batches += 1
+            self.latencies.extend(done - submitted for _, _, submitted in pending)
+
+    def stats(self):
+        """處理量與延遲統計（延遲為最近 LATENCY_WINDOW 筆請求，單位毫秒）"""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            elapsed = time.time() - self.started_at
+            return {
+                "requests": self.requests,
+                "texts": self.texts,
+                "batches": self.batches,
+                "errors": self.errors,
+                "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0,
+                "texts_per_second": round(self.texts / elapsed, 2) if elapsed else 0,
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else 0,
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else 0,
+                "latency_ms_max": round(float(latencies.max()), 2) if len(latencies) else 0,
+            }
+
+
+def make_server(model, model_name, version="unknown", host=HOST, port=PORT, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+    """建立 HTTP 服務（尚未開始服務）：POST /encode、GET /stats、GET /health"""
+    batcher = MicroBatcher(model, max_batch, max_wait)
+    info = {"model": model_name, "version": version, "backend": getattr(model, "backend", "fp32")}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/encode":
+                self.send_error(404)
+                return
+            try:
+                texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["texts"]
+                vectors = batcher.encode(texts)
+            except Exception as e:
+                self._send_json({"error": str(e)}, 500)
+                return
+            # 向量以 float32 原始位元組回傳，形狀放在標頭
+            body = np.ascontiguousarray(vectors, dtype="float32").tobytes()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("X-Embedding-Shape", f"{vectors.shape[0]},{vectors.shape[1]}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json({**info, **batcher.stats()})
+            elif self.path == "/health":
+                self._send_json(info)
+            else:
+                self.send_error(404)
+
+        def _send_json(self, data, status=200):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+class EmbeddingClient:
+    """向量服務的用戶端，encode 的用法與 SentenceTransformer 相同，可直接交給 EmbeddingCache"""
+
+    def __init__(self, url=DEFAULT_URL, timeout=60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        info = self.session.get(self.url + "/health", timeout=2).json()
+        self.model_name = info["model"]
+        self.version = info["version"]
+        self.backend = info.get("backend", "fp32")
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        response = self.session.post(self.url + "/encode", json={"texts": list(texts)}, timeout=self.timeout)
+        response.raise_for_status()
+        rows, dim = map(int, response.headers["X-Embedding-Shape"].split(","))
+        return np.frombuffer(response.content, dtype="float32").reshape(rows, dim)
+
+    def stats(self):
+        return self.session.get(self.url + "/stats", timeout=2).json()
+
+
+def load_model(model_name=MODEL_NAME, url=DEFAULT_URL, backend="fp32"):
+    """有執行中的向量服務時回傳 EmbeddingClient，否則在本程序以指定的推論後端載入模型
+    （服務使用的後端可能不同，向量版本會帶著後端名稱，快取不會混用）"""
+    try:
+        client = EmbeddingClient(url)
+        if client.model_name == model_name:
+            print(f"✅ 使用向量服務 {url}（{model_name}，{client.backend}）")
+            return client
+        print(f"⚠️ 向量服務的模型是 {client.model_name}，改為自行載入 {model_name}")
+    except requests.RequestException:
+        pass
+    from encoder_backends import load_encoder
+    return load_encoder(model_name, backend)
+
+
+def _benchmark(clients=8, requests_per_client=25, overhead=0.02):
+    """以 TinyRandomEncoder（每次前向固定 overhead 秒）比較不合併與合併成批的處理量與延遲"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    texts = [f"被告犯竊盜罪，處有期徒刑{i}月" for i in range(clients * requests_per_client)]
+    results = {}
+    for label, max_batch in (("逐筆（max_batch=1）", 1), (f"合併成批（max_batch={MAX_BATCH}）", MAX_BATCH)):
+        model = TinyRandomEncoder(overhead=overhead)
+        server = make_server(model, model.name, model.version, port=0, max_batch=max_batch)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://{HOST}:{server.server_port}"
+        try:
+            client_pool = [EmbeddingClient(url) for _ in range(clients)]
+
+            def run(i):
+                client = client_pool[i]
+                return [client.encode([text]) for text in texts[i::clients]]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(clients) as pool:
+                outputs = list(pool.map(run, range(clients)))
+            elapsed = time.perf_counter() - started
+            stats = client_pool[0].stats()
+            results[label] = np.concatenate([np.concatenate(chunk) for chunk in outputs])
+            print(f"{label}：{len(texts)} 個請求 {elapsed:.2f} 秒（{len(texts) / elapsed:.0f} 段/秒），"
+                  f"{stats['batches']} 批，平均每批 {stats['mean_batch_size']} 段，"
+                  f"延遲 p50 {stats['latency_ms_p50']} ms、p95 {stats['latency_ms_p95']} ms")
+        finally:
+            server.shutdown()
+            server.server_close()
+    first, second = results.values()
+    expected = TinyRandomEncoder().encode([text for i in range(clients) for text in texts[i::clients]])
+    ok = np.allclose(first, second, atol=1e-6) and np.allclose(first, expected, atol=1e-6)
+    print("✅ 合併成批的結果與逐筆相同" if ok else "❌ 合併成批的結果不同")
+
+
+if __name__ == "__main__":
+    from encoder_backends import BACKENDS, load_encoder
+
+    parser = argparse.ArgumentParser(description="常駐的文字向量服務")
+    parser.add_argument("--model", default=MODEL_NAME, help="SentenceTransformer 模型名稱")
+    parser.add_argument("--tiny", action="store_true", help="改用隨機初始化的小模型（測試用，不需下載）")
+    parser.add_argument("--backend", default="fp32", choices=BACKENDS, help="推論後端")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="每批最多的文字數")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT, help="合併請求的最長等待時間（秒）")
+    parser.add_argument("--benchmark", action="store_true", help="以小模型比較逐筆與合併成批")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark()
+    else:
+        if args.tiny:
+            model = TinyRandomEncoder()
+            model_name, version = model.name, model.version
+        else:
+            from embedding_cache import model_version
+
+            model = load_encoder(args.model, args.backend)
+            model_name, version = args.model, model_version(model)
+        server = make_server(model, model_name, version, args.host, args.port, args.max_batch, args.max_wait)
+        print(f"✅ 向量服務已啟動：http://{args.host}:{args.port}（{model_name}，{getattr(model, 'backend', 'fp32')}）")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"📋 {server.batcher.stats()}")
@@ -0,0 +1,159 @@
+import argparse
+import copy
+import time
+
+import numpy as np
+
+# 文字向量模型的推論後端：fp32（原本的 SentenceTransformer）、int8（Linear 層動態量化）、
+# onnx（需安裝 optimum 等匯出套件）。非 fp32 的後端在模型版本後加上後端名稱，向量快取分開存放；
+# evaluate 比較各後端與 fp32 的向量餘弦一致度、近鄰重疊與 calculate_metrics 的 MAE／R²
+BACKENDS = ("fp32", "int8", "onnx")
+NEIGHBORS = 7  # 與 FAISS 腳本的 k 相同
+
+
+def _tag(model, backend):
+    """在模型上記錄後端；fp32 維持原本的版本，沿用既有的向量快取"""
+    from embedding_cache import model_version
+
+    model.backend = backend
+    if backend != "fp32":
+        model.version = f"{model_version(model)}+{backend}"
+    return model
+
+
+def load_encoder(model_name, backend="fp32"):
+    """依後端載入 SentenceTransformer，回傳的物件一樣以 encode 取得向量"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的後端 {backend}，可用：{', '.join(BACKENDS)}")
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        # sentence-transformers 3.2 以上透過 optimum 匯出；沒有安裝時明確告知
+        try:
+            return _tag(SentenceTransformer(model_name, backend="onnx"), backend)
+        except (ImportError, TypeError) as e:
+            raise RuntimeError(f"ONNX 後端需要 sentence-transformers>=3.2 與 optimum[onnxruntime]：{e}") from e
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        import torch
+
+        # 只量化 Linear 層的權重，啟動值在執行時動態量化；嵌入層與 LayerNorm 維持 fp32
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return _tag(model, backend)
+
+
+def quantize_tiny(encoder):
+    """TinyRandomEncoder 的 int8 版本（權重依欄對稱量化後還原），用來在沒有 torch 的環境驗證評估流程"""
+    quantized = copy.deepcopy(encoder)
+    for name in ("embedding", "weight"):
+        matrix = getattr(encoder, name)
+        scale = np.abs(matrix).max(axis=0, keepdims=True) / 127
+        setattr(quantized, name, (np.round(matrix / scale).clip(-127, 127) * scale).astype(matrix.dtype))
+    quantized.name = encoder.name
+    quantized.version = f"{encoder.version}+int8"
+    quantized.backend = "int8"
+    return quantized
+
+
+def _neighbors(train, queries, k):
+    """L2 最近鄰；有 faiss 時用 IndexFlatL2，否則以 numpy 計算"""
+    try:
+        import faiss
+
+        index = faiss.IndexFlatL2(train.shape[1])
+        index.add(np.ascontiguousarray(train))
+        return index.search(np.ascontiguousarray(queries), k)
+    except ImportError:
+        distances = ((queries[:, None, :] - train[None, :, :]) ** 2).sum(axis=2)
+        indices = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, indices, axis=1), indices
+
+
+def knn_metrics(embeddings, sentences, test_size=0.2, seed=42, k=NEIGHBORS):
+    """與 calculate_metrics 相同的預測方式（最近 k 個判例的刑期以 exp(-距離) 加權平均），回傳 MAE、R² 與各測試列的近鄰"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(sentences))
+    test_count = max(1, int(round(len(order) * test_size)))
+    test, train = order[:test_count], order[test_count:]
+    distances, indices = _neighbors(embeddings[train], embeddings[test], min(k, len(train)))
+    weights = np.exp(-distances)
+    invalid = ~np.isfinite(weights).all(axis=1) | (weights.sum(axis=1) == 0)
+    weights[invalid] = 1
+    weights /= weights.sum(axis=1, keepdims=True)
+    predictions = (sentences[train][indices] * weights).sum(axis=1)
+    actuals = sentences[test]
+    mae = np.abs(actuals - predictions).mean()
+    total = ((actuals - actuals.mean()) ** 2).sum()
+    r2 = 1 - ((actuals - predictions) ** 2).sum() / total if total else float("nan")
+    return {"mae": float(mae), "r2": float(r2), "neighbors": indices}
+
+
+def evaluate(encoders, texts, sentences, reference="fp32", batch_size=32, repeats=3):
+    """各後端編碼同一批文字，回傳每個後端的耗時（repeats 次取最快）、加速倍數、與基準的餘弦一致度、近鄰重疊率與 MAE／R²"""
+    sentences = np.asarray(sentences, dtype="float64")
+    vectors, seconds = {}, {}
+    for name, encoder in encoders.items():
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # 暖機，不計時間
+        seconds[name] = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            vectors[name] = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype="float32")
+            seconds[name] = min(seconds[name], time.perf_counter() - started)
+    base = vectors[reference]
+    base_metrics = knn_metrics(base, sentences)
+    report = {}
+    for name, encoded in vectors.items():
+        cosine = (base * encoded).sum(axis=1) / (np.linalg.norm(base, axis=1) * np.linalg.norm(encoded, axis=1))
+        metrics = knn_metrics(encoded, sentences)
+        overlap = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(base_metrics["neighbors"], metrics["neighbors"])])
+        report[name] = {
+            "seconds": seconds[name],
+            "speedup": seconds[reference] / seconds[name],
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            "neighbor_overlap": float(overlap),
+            "mae": metrics["mae"],
+            "r2": metrics["r2"],
+        }
+    return report
+
+
+def print_report(report, reference="fp32"):
+    print(f"{'後端':<6}{'秒數':>8}{'加速':>7}{'餘弦平均':>10}{'餘弦最小':>10}{'近鄰重疊':>10}{'MAE':>10}{'R²':>8}")
+    for name, row in report.items():
+        print(f"{name:<6}{row['seconds']:>8.2f}{row['speedup']:>6.2f}x{row['cosine_mean']:>10.4f}"
+              f"{row['cosine_min']:>10.4f}{row['neighbor_overlap']:>10.1%}{row['mae']:>10.1f}{row['r2']:>8.3f}")
+    base = report[reference]
+    for name, row in report.items():
+        if name != reference:
+            print(f"📋 {name}：MAE 變化 {row['mae'] - base['mae']:+.1f} 天，R² 變化 {row['r2'] - base['r2']:+.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比較各推論後端與 fp32 的速度與準確度")
+    parser.add_argument("--model", default="DMetaSoul/sbert-chinese-general-v2")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8"], choices=BACKENDS)
+    parser.add_argument("--dataset", default="C:/Users/李/Desktop/數據分析/outputarea/Tovector",
+                        help="case_dataset 資料集路徑")
+    parser.add_argument("--tiny", action="store_true",
+                        help="改用隨機初始化的小模型與其 int8 版本（不需 torch，只驗證準確度的計算，速度沒有意義）")
+    args = parser.parse_args()
+
+    from case_dataset import load_dataset
+
+    df = load_dataset(args.dataset, columns=["原始內容", "刑期(天)"], filters=[("刑期(天)", ">", 0)])
+    texts = df["原始內容"].fillna("").tolist()
+    if args.tiny:
+        from embedding_server import TinyRandomEncoder
+
+        tiny = TinyRandomEncoder(dim=256)
+        encoders = {"fp32": tiny, "int8": quantize_tiny(tiny)}
+    else:
+        encoders = {}
+        for backend in dict.fromkeys(["fp32", *args.backends]):
+            try:
+                encoders[backend] = load_encoder(args.model, backend)
+            except RuntimeError as e:
+                print(f"⚠️ 略過 {backend}：{e}")
+    print(f"📂 {len(texts)} 段有刑期的原始內容")
+    print_report(evaluate(encoders, texts, df["刑期(天)"].to_numpy()))
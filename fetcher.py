@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urljoin, urlparse, parse_qs, quote
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+from compact_record import store_page
+from frontier import judgment_id_from_url, judgment_date_from_id
+from ratelimit import AdaptiveRateLimiter, TimingStats
+
+# 並行下載裁判書詳細頁：搜尋結果列表只抓一次，收集所有 href 後以連線池並行下載
+DEFAULT_CONCURRENCY = 8
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
+}
+
+
+def parse_result_page(html, base_url):
+    """解析搜尋結果列表，回傳 (詳細頁連結, 下一頁連結)"""
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(base_url, a["href"]) for a in soup.select("a.hlTitle_scroll") if a.get("href")]
+    next_link = soup.find("a", id="hlNext")
+    next_url = urljoin(base_url, next_link["href"]) if next_link and next_link.get("href") else None
+    return links, next_url
+
+
+def make_session(concurrency=DEFAULT_CONCURRENCY, cookies=None, headers=None, proxy=None, timeout=30):
+    """建立共用連線池的 aiohttp session，支援 Tor 的 SOCKS5 代理"""
+    if proxy and proxy.startswith("socks"):
+        from aiohttp_socks import ProxyConnector  # 只有走 Tor 時才需要
+        connector = ProxyConnector.from_url(proxy, limit=concurrency, limit_per_host=concurrency)
+    else:
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    return aiohttp.ClientSession(
+        connector=connector,
+        cookies=cookies,
+        headers=headers or DEFAULT_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    )
+
+
+async def fetch_text(session, url, limiter=None, stats=None, stage="detail"):
+    """下載單一頁面並回傳文字內容；有限速器時先取得令牌，並回報延遲與成敗"""
+    if limiter:
+        waited = await limiter.acquire_async()
+        if stats:
+            stats.add("rate_wait", waited)
+    started = time.perf_counter()
+    ok = False
+    try:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            text = await response.text()
+        ok = True
+        return text
+    finally:
+        elapsed = time.perf_counter() - started
+        if limiter:
+            limiter.record(elapsed, ok)
+        if stats:
+            stats.add(stage, elapsed, ok)
+
+
+async def collect_detail_links(session, list_url, max_pages=None, limiter=None, stats=None, stop=None):
+    """依序翻頁抓取結果列表，收集所有詳細頁連結；stop(本頁連結) 為真時不再往下翻頁"""
+    links = []
+    page = 0
+    url = list_url
+    while url and (max_pages is None or page < max_pages):
+        html = await fetch_text(session, url, limiter, stats, "result_list")
+        page_links, url = parse_result_page(html, list_url)
+        links.extend(page_links)
+        page += 1
+        print(f"第 {page} 頁結果，取得 {len(page_links)} 筆連結")
+        if stop and stop(page_links):
+            print("已到達上次爬取過的結果，停止翻頁")
+            break
+    return links
+
+
+def reached_known(frontier):
+    """增量模式的停止條件：整頁都已在佇列中，或整頁都早於上次看到的最新裁判日期"""
+    newest_date, _ = frontier.watermark()
+
+    def stop(page_links):
+        if all(frontier.state(url) is not None for url in page_links):
+            return True
+        dates = [judgment_date_from_id(judgment_id_from_url(url)) for url in page_links]
+        return newest_date is not None and all(date is not None and date < newest_date for date in dates)
+
+    return stop
+
+
+def write_delta(rows, delta_dir="deltas"):
+    """把本次新抓到的裁判書寫成 delta_{時間}.jsonl，供後續階段只處理增量"""
+    os.makedirs(delta_dir, exist_ok=True)
+    path = os.path.join(delta_dir, f"delta_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for case_no, jid, url in rows:
+            f.write(json.dumps({"case_no": case_no, "judgment_id": jid, "url": url}, ensure_ascii=False) + "\n")
+    return path
+
+
+async def fetch_details(session, jobs, out_dir=".", concurrency=DEFAULT_CONCURRENCY, frontier=None,
+                        limiter=None, stats=None, archive=None, compact=False, keep_html=False):
+    """以有限並行數下載詳細頁，jobs 為 [(編號, 連結)]，存成 case_{n}_detail 檔或寫入封存庫；回傳失敗的連結"""
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = []
+
+    async def fetch_one(n, url):
+        async with semaphore:
+            try:
+                html = await fetch_text(session, url, limiter, stats, "detail")
+            except Exception as e:
+                print(f"⚠️ 下載第 {n} 筆裁判書失敗: {url}，錯誤: {e}")
+                failed.append(url)
+                if frontier:
+                    frontier.mark_failed(url, e)
+                return
+        store_page(html, judgment_id_from_url(url) or url, n, out_dir, archive, compact, keep_html)
+        if frontier:
+            frontier.mark_fetched(url)
+        print(f"✅ 第 {n} 筆裁判書: {judgment_id_from_url(url)}")
+
+    await asyncio.gather(*(fetch_one(n, url) for n, url in jobs))
+    return failed
+
+
+async def crawl(list_url, out_dir=".", start_index=1, concurrency=DEFAULT_CONCURRENCY,
+                cookies=None, headers=None, proxy=None, max_pages=None, frontier=None,
+                limiter=None, stats=None, archive=None, compact=False, keep_html=False,
+                incremental=False, delta_dir="deltas"):
+    """從結果列表網址開始，收集連結並並行下載所有詳細頁；有 frontier 時只抓尚未完成的。
+    incremental 時翻到已知的結果就停止，並把本次新抓到的裁判書另存成增量清單"""
+    os.makedirs(out_dir, exist_ok=True)
+    run_started = time.time()
+    stop = reached_known(frontier) if incremental and frontier else None
+    async with make_session(concurrency, cookies, headers, proxy) as session:
+        links = await collect_detail_links(session, list_url, max_pages, limiter, stats, stop)
+        if frontier:
+            added = frontier.add(links)
+            jobs = frontier.pending()
+            print(f"共收集到 {len(links)} 筆裁判書連結，新增 {added} 筆，待抓取 {len(jobs)} 筆")
+        else:
+            jobs = list(enumerate(links, start_index))
+            print(f"共收集到 {len(links)} 筆裁判書連結")
+        print(f"開始並行下載（並行數 {concurrency}）")
+        started = time.perf_counter()
+        failed = await fetch_details(session, jobs, out_dir, concurrency, frontier, limiter, stats, archive,
+                                     compact, keep_html)
+        elapsed = time.perf_counter() - started
+    done = len(jobs) - len(failed)
+    print(f"📂 下載完成 {done} 筆，失敗 {len(failed)} 筆，耗時 {elapsed:.1f} 秒")
+    if limiter:
+        print(f"目前請求速率: {limiter.rate:.2f} 次/秒")
+    if stats:
+        stats.summary()
+    if frontier:
+        delta = frontier.fetched_since(run_started)
+        newest_date, newest_id = frontier.update_watermark(jid for _, jid, _ in delta)
+        print(f"本次新增 {len(delta)} 筆，最新裁判日期 {newest_date}（{newest_id}）")
+        if incremental:
+            print(f"增量清單已寫入 {write_delta(delta, delta_dir)}")
+    return jobs, failed
+
+
+# 本地替身網站：以既有的 case_*_detail.html 模擬結果列表與詳細頁，方便離線測試
+class _LocalCaseHandler(SimpleHTTPRequestHandler):
+    case_dir = "."
+    page_size = 20
+    cases = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _cases(self):
+        """[(裁判書ID, 檔名)]，與網站一樣依裁判日期由新到舊排序"""
+        cls = type(self)
+        if cls.cases is None:
+            from archive import judgment_id_from_html
+
+            files = sorted(
+                (f for f in os.listdir(self.case_dir) if re.fullmatch(r"case_\d+_detail\.html", f)),
+                key=lambda f: int(re.search(r"\d+", f).group()),
+            )
+            cases = {}
+            for name in files:
+                with open(os.path.join(self.case_dir, name), "r", encoding="utf-8") as f:
+                    jid = judgment_id_from_html(f.read()) or name[:-len("_detail.html")]
+                cases.setdefault(jid, name)
+            cls.cases = sorted(cases.items(), key=lambda item: judgment_date_from_id(item[0]) or "", reverse=True)
+        return cls.cases
+
+    def _send(self, body, status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path.endswith("qryresultlst.aspx"):
+            cases = self._cases()
+            page = int(query.get("page", ["1"])[0])
+            chunk = cases[(page - 1) * self.page_size:page * self.page_size]
+            rows = "".join(
+                f'<a class="hlTitle_scroll" href="data.aspx?ty=JD&id={quote(jid)}">{jid}</a>\n'
+                for jid, _ in chunk
+            )
+            if page * self.page_size < len(cases):
+                rows += f'<a id="hlNext" href="qryresultlst.aspx?page={page + 1}">下一頁</a>\n'
+            self._send(f"<html><body>{rows}</body></html>")
+        elif parsed.path.endswith("data.aspx") and "id" in query:
+            name = dict(self._cases()).get(query["id"][0])
+            if name is None:
+                self._send("not found", status=404)
+                return
+            path = os.path.join(self.case_dir, name)
+            with open(path, "r", encoding="utf-8") as f:
+                self._send(f.read())
+        else:
+            self._send("not found", status=404)
+
+
+def serve_local_cases(case_dir=".", port=0, page_size=20):
+    """在背景執行緒啟動本地替身網站，回傳 (server, 結果列表網址)"""
+    handler = type("LocalCaseHandler", (_LocalCaseHandler,), {"case_dir": case_dir, "page_size": page_size})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/FJUD/qryresultlst.aspx?page=1"
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="並行下載裁判書詳細頁")
+    parser.add_argument("list_url", nargs="?", help="搜尋結果列表網址（iframe-data 的 src）")
+    parser.add_argument("--out", default=".", help="輸出資料夾")
+    parser.add_argument("--start", type=int, default=1, help="起始編號")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--frontier", help="爬取佇列 SQLite 路徑，重新執行時跳過已下載的裁判書")
+    parser.add_argument("--archive", help="寫入此封存庫資料夾，而非個別 HTML 檔")
+    parser.add_argument("--compact", action="store_true", help="只儲存精簡紀錄（ID、標題、基本資料、PDF 連結、內文）")
+    parser.add_argument("--incremental", action="store_true", help="只抓上次爬取之後的新裁判書（需搭配 --frontier）")
+    parser.add_argument("--rate", type=float, help="初始每秒請求數（啟用自適應限速）")
+    parser.add_argument("--local", action="store_true", help="對本地替身網站下載既有的 case_*_detail.html")
+    args = parser.parse_args()
+    frontier = None
+    if args.frontier:
+        from frontier import Frontier
+        frontier = Frontier(args.frontier, args.start)
+    limiter = AdaptiveRateLimiter(rate=args.rate) if args.rate else None
+    stats = TimingStats()
+    archive = None
+    if args.archive:
+        from archive import JudgmentArchive
+        archive = JudgmentArchive(args.archive)
+
+    if args.local:
+        server, list_url = serve_local_cases(".")
+        out_dir = tempfile.mkdtemp(prefix="fetch_local_")
+        try:
+            asyncio.run(crawl(list_url, out_dir, args.start, args.concurrency, frontier=frontier,
+                              limiter=limiter, stats=stats, archive=archive, compact=args.compact,
+                              incremental=args.incremental))
+        finally:
+            server.shutdown()
+        print(f"本地測試輸出於 {out_dir}")
+    elif args.list_url:
+        asyncio.run(crawl(args.list_url, args.out, args.start, args.concurrency, frontier=frontier,
+                          limiter=limiter, stats=stats, archive=archive, compact=args.compact,
+                          incremental=args.incremental))
+    else:
+        parser.print_help()
+    if archive is not None:
+        archive.close()
@@ -0,0 +1,174 @@
+import re
+import sqlite3
+import time
+from urllib.parse import urlparse, parse_qs, unquote
+
+# 可續抓的爬取佇列：以裁判書 ID 去重，記錄每個網址的狀態、嘗試次數與時間
+QUEUED = "queued"
+FETCHED = "fetched"
+FAILED = "failed"
+
+DEFAULT_PATH = "crawl_frontier.sqlite"
+MAX_ATTEMPTS = 3
+
+
+def judgment_id_from_url(url):
+    """從詳細頁連結取出裁判書 ID（例如 CYDM,114,聲,195,20250314,1）"""
+    query = parse_qs(urlparse(url).query)
+    if "id" not in query:
+        return None
+    jid = query["id"][0]
+    # 網站同時使用 %uXXXX 與 UTF-8 百分比編碼
+    jid = re.sub(r"%u([0-9a-fA-F]{4})", lambda m: chr(int(m.group(1), 16)), jid)
+    return unquote(jid)
+
+
+def judgment_date_from_id(jid):
+    """裁判書 ID 中的裁判日期（YYYYMMDD），找不到時回傳 None"""
+    match = re.search(r",(\d{8}),", jid or "")
+    return match.group(1) if match else None
+
+
+class Frontier:
+    """以 SQLite 保存的爬取佇列，重新啟動時跳過已完成的裁判書，只重試失敗的"""
+
+    def __init__(self, path=DEFAULT_PATH, start_index=1):
+        self.path = path
+        self.start_index = start_index
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS frontier (
+                judgment_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                case_no INTEGER UNIQUE,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                error TEXT
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier(state)")
+        # 增量爬取的水位（最新裁判日期與 ID）等設定
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # 結果列表頁的完成紀錄，讓瀏覽器工作池在程序崩潰後只重派未完成的頁
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                page INTEGER PRIMARY KEY,
+                worker INTEGER,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def next_case_no(self):
+        """下一個可用的檔案編號（取代手動修改 idxx）"""
+        row = self.conn.execute("SELECT MAX(case_no) FROM frontier").fetchone()
+        return self.start_index if row[0] is None else row[0] + 1
+
+    def add(self, urls):
+        """把網址加入佇列，已存在的裁判書 ID 直接略過；回傳新增筆數"""
+        added = 0
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")  # 多個程序同時寫入時確保檔案編號不重複
+            case_no = self.next_case_no()
+            for url in urls:
+                jid = judgment_id_from_url(url) or url
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO frontier (judgment_id, url, case_no, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (jid, url, case_no, QUEUED, now),
+                )
+                if cursor.rowcount:
+                    added += 1
+                    case_no += 1
+        return added
+
+    def state(self, url):
+        """查詢網址目前的狀態，未知則回傳 None"""
+        jid = judgment_id_from_url(url) or url
+        row = self.conn.execute("SELECT state FROM frontier WHERE judgment_id = ?", (jid,)).fetchone()
+        return row[0] if row else None
+
+    def case_no(self, url):
+        """網址對應的檔案編號（case_{n}_detail.html）"""
+        jid = judgment_id_from_url(url) or url
+        row = self.conn.execute("SELECT case_no FROM frontier WHERE judgment_id = ?", (jid,)).fetchone()
+        return row[0] if row else None
+
+    def pending(self, max_attempts=MAX_ATTEMPTS):
+        """待處理清單：尚未抓取的，以及失敗但未超過嘗試上限的；回傳 [(case_no, url)]"""
+        return self.conn.execute(
+            "SELECT case_no, url FROM frontier WHERE state = ? OR (state = ? AND attempts < ?) ORDER BY case_no",
+            (QUEUED, FAILED, max_attempts),
+        ).fetchall()
+
+    def mark_fetched(self, url):
+        self._mark(url, FETCHED, None)
+
+    def mark_failed(self, url, error):
+        self._mark(url, FAILED, str(error)[:500])
+
+    def _mark(self, url, state, error):
+        jid = judgment_id_from_url(url) or url
+        with self.conn:
+            self.conn.execute(
+                "UPDATE frontier SET state = ?, attempts = attempts + 1, updated_at = ?, error = ? WHERE judgment_id = ?",
+                (state, time.time(), error, jid),
+            )
+
+    def mark_page_done(self, page, worker=None):
+        """記錄結果列表第 page 頁已處理完"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (page, worker, updated_at) VALUES (?, ?, ?)",
+                (page, worker, time.time()),
+            )
+
+    def done_pages(self):
+        """已處理完的結果列表頁碼"""
+        return {row[0] for row in self.conn.execute("SELECT page FROM pages")}
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def watermark(self):
+        """上次爬取看到的最新 (裁判日期, 裁判書ID)"""
+        return self.get_meta("newest_date"), self.get_meta("newest_id")
+
+    def fetched_since(self, since):
+        """某時間點之後抓取完成的裁判書 [(case_no, judgment_id, url)]，即本次的增量"""
+        return self.conn.execute(
+            "SELECT case_no, judgment_id, url FROM frontier WHERE state = ? AND updated_at >= ? ORDER BY case_no",
+            (FETCHED, since),
+        ).fetchall()
+
+    def update_watermark(self, judgment_ids):
+        """以新抓到的裁判書更新水位"""
+        newest_date, newest_id = self.watermark()
+        for jid in judgment_ids:
+            date = judgment_date_from_id(jid)
+            if date and (newest_date is None or date > newest_date):
+                newest_date, newest_id = date, jid
+        if newest_date:
+            self.set_meta("newest_date", newest_date)
+            self.set_meta("newest_id", newest_id)
+        return newest_date, newest_id
+
+    def counts(self):
+        """各狀態筆數"""
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall())
@@ -0,0 +1,506 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from embedding_cache import NORMALIZERS, model_version
+
+# 建一次、查多次的相似判例索引：資料夾內有 index.faiss（IVF，倒排表中存的是判決 ID）與 meta.sqlite
+# （每個判決 ID 的裁判書ID、刑期、法院、日期與內容摘要，以及建立索引時的向量模型指紋）。
+# 判決 ID 由 tidy.py 整理出的裁判書ID 換算而來，內容修正後重新擷取仍是同一筆。
+# 查詢時以 mmap 開啟索引、依 ID 從 SQLite 取判例，不必重新訓練，也不必依賴同一個隨機切分。
+# 新判決以 upsert／remove 直接加入或移出現有的聚類，並記錄訓練後的變化，偏離太多時才提示重新訓練
+BUNDLE_PATH = 'court_index_bundle'
+BUNDLE_FORMAT = 3  # 資料夾內容的格式版本，不相容的變更時加一
+SNIPPET_CHARS = 50
+NPROBE = 75
+NEIGHBORS = 7
+ID_COLUMN = '裁判書ID'
+CASE_COLUMNS = {'judgment_id': ID_COLUMN, 'sentence_days': '刑期(天)', 'court': '法院名稱', 'date': '裁判日期',
+                'snippet': '原始內容'}
+
+# 重新訓練的門檻（needs_retrain）
+RETRAIN_CHANGED = 0.3  # 訓練後新增、取代與刪除的筆數占訓練筆數的比例
+RETRAIN_RESIDUAL = 1.25  # 新增向量到最近質心的平均平方距離，是訓練資料的幾倍
+RETRAIN_SHIFT = 0.25  # 有變動的聚類，向量平均偏離質心的平方距離（以訓練資料到質心的平均平方距離為 1）；
+#                       聚類內 m 筆隨機分布的向量本身約為 1/m
+RETRAIN_IMBALANCE = 1.5  # 聚類大小不均（faiss imbalance_factor）是訓練後的幾倍
+
+
+def judgment_ids(df):
+    """FAISS 用的判決 ID：裁判書ID（例如 CYDM,114,聲,195,20250314,1）的 SHA-1 前 60 位元（int64，不會是負數）"""
+    if ID_COLUMN not in df.columns:
+        raise ValueError(f"資料缺少「{ID_COLUMN}」欄，請以 tidy.py 重新整理後再正規化")
+    keys = df[ID_COLUMN].astype(object)
+    if keys.isna().any() or (keys.astype(str).str.strip() == '').any():
+        raise ValueError(f"有 {int((keys.isna() | (keys.astype(str).str.strip() == '')).sum())} 列沒有{ID_COLUMN}")
+    return pd.Series([int(hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:15], 16) for key in keys],
+                     index=df.index, dtype='int64')
+
+
+def fingerprint(embeddings):
+    """EmbeddingCache 的模型名稱、版本與正規化方式；查詢時的向量必須與建索引時相同"""
+    return {'model': embeddings.model_name, 'version': embeddings.version,
+            'normalization': embeddings.normalization}
+
+
+def _digest(ids, days, model_info, ncentroids):
+    h = hashlib.sha1(json.dumps([model_info, ncentroids, BUNDLE_FORMAT], sort_keys=True).encode('utf-8'))
+    order = np.argsort(ids, kind='stable')
+    h.update(np.ascontiguousarray(ids[order]).tobytes())
+    h.update(np.ascontiguousarray(days[order], dtype='float64').tobytes())
+    return h.hexdigest()
+
+
+def _case_rows(ids, df, lists):
+    dates = df['裁判日期'].astype(str).str[:10]
+    return zip(ids.tolist(), df[ID_COLUMN].astype(str).tolist(), df['刑期(天)'].astype(float).tolist(),
+               df['法院名稱'].astype(str).tolist(),
+               dates.tolist(), df['原始內容'].fillna('').astype(str).str[:SNIPPET_CHARS].tolist(),
+               np.asarray(lists).ravel().tolist())
+
+
+def _checked_ids(df, vectors):
+    """計算判決 ID；同一裁判書ID 出現多次時無法判斷該用哪一筆，拋出 ValueError"""
+    ids = judgment_ids(df).to_numpy()
+    if len(vectors) != len(ids):
+        raise ValueError(f"向量 {len(vectors)} 列與資料 {len(ids)} 列數量不同")
+    duplicated = pd.Series(ids).duplicated(keep=False).to_numpy()
+    if duplicated.any():
+        names = list(dict.fromkeys(df[ID_COLUMN].astype(str)[duplicated]))
+        raise ValueError(f"{len(names)} 個{ID_COLUMN}重複（例如 {'、'.join(names[:3])}），請先去除重複的判決")
+    return ids, df, np.ascontiguousarray(vectors, dtype='float32')
+
+
+class IndexBundle:
+    """開啟已建立的索引資料夾；writable=False 時以 mmap 讀取索引，啟動只需數毫秒。
+    writable=True 時整份載入記憶體，可 upsert／remove，save 後才寫回（close 前沒有 save 的變更會捨棄）"""
+
+    def __init__(self, path=BUNDLE_PATH, writable=False):
+        self.path = path
+        self.writable = writable
+        self.conn = sqlite3.connect(os.path.join(path, 'meta.sqlite'), timeout=30)
+        self.info = {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM meta")}
+        if self.info.get('format') != BUNDLE_FORMAT:
+            self.conn.close()
+            raise RuntimeError(f"{path} 的格式版本為 {self.info.get('format')}，需要 {BUNDLE_FORMAT}，請重新建立")
+        flags = 0 if writable else faiss.IO_FLAG_MMAP
+        self.index = faiss.read_index(os.path.join(path, 'index.faiss'), flags)
+        self.index.nprobe = NPROBE
+
+    def close(self):
+        self.conn.close()
+        self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @property
+    def fingerprint(self):
+        return {key: self.info[key] for key in ('model', 'version', 'normalization')}
+
+    def check_model(self, model):
+        """查詢用的模型版本與建索引時不同時提醒（向量不一致，相似度沒有意義）"""
+        version = model_version(model)
+        if version != self.info['version']:
+            print(f"⚠️ 模型版本 {version} 與索引建立時的 {self.info['version']} 不同，請重新建立索引")
+            return False
+        return True
+
+    def cases(self, ids):
+        """依 ID 取出判例（依傳入順序，index 為判決 ID）；搜尋不足 k 筆時的 -1 會略過"""
+        ids = [int(i) for i in ids if i >= 0]
+        found = {}
+        for start in range(0, len(ids), 900):  # SQLite 參數數量上限
+            chunk = ids[start:start + 900]
+            query = f"SELECT id, {', '.join(CASE_COLUMNS)} FROM cases WHERE id IN ({','.join('?' * len(chunk))})"
+            found.update((row[0], row[1:]) for row in self.conn.execute(query, chunk))
+        ids = [i for i in ids if i in found]
+        return pd.DataFrame([found[i] for i in ids], columns=list(CASE_COLUMNS.values()),
+                            index=pd.Index(ids, name='判決ID'))
+
+    def matched(self, distances, ids):
+        """搜尋結果的一列對上判例：略過 -1 與沒有判例資料的 ID，回傳 (判例, 與判例逐列對齊的距離)"""
+        distance = dict(zip(np.asarray(ids).tolist(), np.asarray(distances).tolist()))
+        cases = self.cases(np.asarray(ids))
+        return cases, np.array([distance[i] for i in cases.index], dtype='float64')
+
+    def _require_writable(self):
+        if not self.writable:
+            raise RuntimeError("索引以唯讀（mmap）開啟，更新時請用 IndexBundle(path, writable=True)")
+
+    def _lists_of(self, ids):
+        """已在索引中的 ID 與其所在的聚類"""
+        ids = [int(i) for i in ids]
+        found = {}
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            query = f"SELECT id, list_no FROM cases WHERE id IN ({','.join('?' * len(chunk))})"
+            found.update(self.conn.execute(query, chunk))
+        return found
+
+    def _drop(self, found):
+        self.index.remove_ids(faiss.IDSelectorBatch(np.fromiter(found, dtype='int64', count=len(found))))
+        self.conn.executemany("INSERT OR IGNORE INTO touched VALUES (?)", [(l,) for l in set(found.values())])
+
+    def upsert(self, df, vectors):
+        """加入判決（df 與 build_bundle 相同的欄位，vectors 為對應的向量），不重新訓練；
+        裁判書ID 已存在（例如重新擷取後內容或刑期不同）時取代原本的向量與判例資料。回傳 (新增筆數, 取代筆數)"""
+        self._require_writable()
+        ids, df, vectors = _checked_ids(df, vectors)
+        if len(ids) == 0:
+            return 0, 0
+        found = self._lists_of(ids)
+        if found:
+            self._drop(found)
+        residual, lists = self.index.quantizer.search(vectors, 1)
+        self.index.add_with_ids(vectors, ids)
+        self.conn.executemany("INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)", _case_rows(ids, df, lists))
+        self.conn.executemany("INSERT OR IGNORE INTO touched VALUES (?)", [(int(l),) for l in np.unique(lists)])
+        self.info['added'] += len(ids)
+        self.info['added_residual'] += float(residual.sum())
+        return len(ids) - len(found), len(found)
+
+    def remove(self, ids):
+        """移除判決（例如重新擷取後已沒有刑期），不在索引中的 ID 略過，回傳移除筆數"""
+        self._require_writable()
+        found = self._lists_of(ids)
+        if found:
+            self._drop(found)
+            self.conn.executemany("DELETE FROM cases WHERE id = ?", [(i,) for i in found])
+            self.info['removed'] += len(found)
+        return len(found)
+
+    def save(self):
+        """寫回更新：先以新檔換掉 index.faiss，再提交 SQLite；中斷時最多留下判例資料與索引不一致的 ID
+        （沒有判例資料的 ID 查詢時會略過）"""
+        self._require_writable()
+        index_path = os.path.join(self.path, 'index.faiss')
+        faiss.write_index(self.index, index_path + '.partial')
+        os.replace(index_path + '.partial', index_path)
+        cases = pd.read_sql_query("SELECT id, sentence_days FROM cases", self.conn)
+        self.info.update(rows=self.index.ntotal, updated_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+                         digest=_digest(cases['id'].to_numpy(), cases['sentence_days'].to_numpy(),
+                                        self.fingerprint, self.info['ncentroids']))
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              [(key, json.dumps(value, ensure_ascii=False)) for key, value in self.info.items()])
+        self.conn.commit()
+
+    def drift(self):
+        """訓練後的變化：變動比例、新增向量到最近質心的距離、有變動的聚類偏離質心的程度與聚類大小不均的程度
+        （後三者都相對於訓練時）"""
+        info = self.info
+        invlists = self.index.invlists
+        centroids = self.index.quantizer.reconstruct_n(0, self.index.nlist)
+        shifts, sizes = [], []
+        for (list_no,) in self.conn.execute("SELECT list_no FROM touched"):
+            size = invlists.list_size(list_no)
+            if size == 0:
+                continue
+            # IVFFlat 的倒排表直接存 float32 向量
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size)
+            mean = codes.view('float32').reshape(size, self.index.d).mean(axis=0)
+            shifts.append(float(((mean - centroids[list_no]) ** 2).sum()))
+            sizes.append(size)
+        baseline = info['baseline_residual'] or 1.0
+        return {
+            'changed': (info['added'] + info['removed']) / max(1, info['trained_rows']),
+            'residual': info['added_residual'] / info['added'] / baseline if info['added'] else 1.0,
+            'shift': float(np.average(shifts, weights=sizes)) / baseline if shifts else 0.0,
+            'imbalance': invlists.imbalance_factor() / info['baseline_imbalance'],
+            'touched_lists': len(shifts),
+        }
+
+    def needs_retrain(self):
+        """值得重新訓練的原因，空串列表示現有的聚類仍適用"""
+        drift = self.drift()
+        reasons = []
+        if drift['changed'] > RETRAIN_CHANGED:
+            reasons.append(f"訓練後變動 {drift['changed']:.0%} 筆（門檻 {RETRAIN_CHANGED:.0%}）")
+        if drift['residual'] > RETRAIN_RESIDUAL:
+            reasons.append(f"新增向量到最近質心的距離是訓練資料的 {drift['residual']:.2f} 倍")
+        if drift['shift'] > RETRAIN_SHIFT:
+            reasons.append(f"有變動的聚類平均偏離質心 {drift['shift']:.2f}（門檻 {RETRAIN_SHIFT}）")
+        if drift['imbalance'] > RETRAIN_IMBALANCE:
+            reasons.append(f"聚類大小不均是訓練後的 {drift['imbalance']:.2f} 倍")
+        return reasons
+
+    def search(self, vectors, k=NEIGHBORS, nprobe=None):
+        """回傳 (距離, 判決 ID)，形狀皆為 (查詢數, k)"""
+        if nprobe is not None:
+            self.index.nprobe = nprobe
+        return self.index.search(np.ascontiguousarray(vectors, dtype='float32'), k)
+
+    def predict(self, vector, k=NEIGHBORS, nprobe=None):
+        """單一查詢向量的加權預估刑期（與 calculate_metrics 相同：exp(-距離) 權重），回傳 (預估天數, 判例)"""
+        distances, ids = self.search(np.asarray(vector).reshape(1, -1), k, nprobe)
+        cases, distance = self.matched(distances[0], ids[0])
+        cases['距離'] = distance
+        weights = np.exp(-distance)
+        if not np.isfinite(weights).all() or weights.sum() == 0:
+            weights = np.ones(len(cases))
+        days = cases['刑期(天)'].to_numpy()
+        if len(cases) == 0 or not np.isfinite(days).all():
+            return np.nan, cases
+        return float(np.average(days, weights=weights)), cases
+
+
+def _replace(partial_path, path):
+    """與 case_dataset.write_dataset 相同：先寫到 partial，完成後才換掉舊的資料夾"""
+    if os.path.exists(path):
+        old_path = path + '.old'
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+        os.replace(partial_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(partial_path, path)
+
+
+def build_bundle(df, vectors, embeddings, path=BUNDLE_PATH, ncentroids=None, rebuild=False):
+    """以 df（需有 裁判書ID、法院名稱、裁判日期、原始內容、刑期(天)）與對應的向量建立索引資料夾，回傳開啟的 IndexBundle。
+    裁判書ID 重複時拋出 ValueError；資料、模型與聚類數都與現有資料夾相同時直接沿用，不重新訓練"""
+    ids, df, vectors = _checked_ids(df, vectors)
+    ncentroids = ncentroids or max(2, len(df) // 20)
+    model_info = fingerprint(embeddings)
+    digest = _digest(ids, df['刑期(天)'].to_numpy(), model_info, ncentroids)
+    if not rebuild and os.path.exists(os.path.join(path, 'meta.sqlite')):
+        try:
+            bundle = IndexBundle(path)
+            if bundle.info.get('digest') == digest:
+                print(f"✅ 沿用現有索引 {path}（{len(bundle)} 筆，建立於 {bundle.info['built_at']}）")
+                return bundle
+            bundle.close()
+        except RuntimeError as e:
+            print(f"⚠️ {e}")
+
+    started = time.perf_counter()
+    d = vectors.shape[1]
+    quantizer = faiss.IndexFlatL2(d)
+    index = faiss.IndexIVFFlat(quantizer, d, ncentroids, faiss.METRIC_L2)
+    index.train(vectors)
+    # IVF 的倒排表本身就存 ID，remove_ids 也直接以判決 ID 刪除（IndexIDMap 包 IVF 時刪除會對錯位置）
+    index.add_with_ids(vectors, ids)
+    # 訓練資料到最近質心的平均平方距離與聚類大小不均的程度，之後更新時以此判斷偏離多少
+    residual, lists = quantizer.search(vectors, 1)
+
+    partial_path = path + '.partial'
+    shutil.rmtree(partial_path, ignore_errors=True)
+    os.makedirs(partial_path)
+    faiss.write_index(index, os.path.join(partial_path, 'index.faiss'))
+    conn = sqlite3.connect(os.path.join(partial_path, 'meta.sqlite'))
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute(
+        """CREATE TABLE cases (
+            id INTEGER PRIMARY KEY,
+            judgment_id TEXT NOT NULL,
+            sentence_days REAL NOT NULL,
+            court TEXT NOT NULL,
+            date TEXT NOT NULL,
+            snippet TEXT NOT NULL,
+            list_no INTEGER NOT NULL
+        )"""
+    )
+    conn.execute("CREATE TABLE touched (list_no INTEGER PRIMARY KEY)")  # 訓練後有新增或移除的聚類
+    conn.executemany("INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)", _case_rows(ids, df, lists))
+    info = {**model_info, 'format': BUNDLE_FORMAT, 'dim': d, 'ncentroids': ncentroids, 'metric': 'L2',
+            'digest': digest, 'rows': len(ids), 'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'trained_rows': len(ids), 'baseline_residual': float(residual.mean()),
+            'baseline_imbalance': index.invlists.imbalance_factor(), 'added': 0, 'removed': 0, 'added_residual': 0.0}
+    conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                     [(key, json.dumps(value, ensure_ascii=False)) for key, value in info.items()])
+    conn.commit()
+    conn.close()
+    _replace(partial_path, path)
+    print(f"✅ 已建立索引 {path}：{len(ids)} 筆，{ncentroids} 個聚類，{time.perf_counter() - started:.1f} 秒")
+    return IndexBundle(path)
+
+
+def benchmark(rows=1_000_000, dim=256, updates=1000, ncentroids=1024, shifted=50_000):
+    """以隨機分布的向量建立 rows 筆的索引，比較更新 updates 筆（一半更正內容與刑期、一半新增，另移除 100 筆）
+    與整份重建的時間並驗證結果；再更正一筆的原始內容，確認舊向量已移除、總筆數不變；
+    最後加入偏離原分布的 shifted 筆，確認 needs_retrain 會提示"""
+    import tempfile
+    from types import SimpleNamespace
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((ncentroids, dim), dtype='float32') * 2
+
+    def vectors_near(n, offset=0.0):
+        vectors = np.empty((n, dim), dtype='float32')
+        for start in range(0, n, 100_000):  # 分段產生，避免暫存陣列占用數倍記憶體
+            stop = min(n, start + 100_000)
+            vectors[start:stop] = centers[rng.integers(0, ncentroids, stop - start)]
+            vectors[start:stop] += rng.standard_normal((stop - start, dim), dtype='float32') + offset
+        return vectors
+
+    def frame(start, n, days=None):
+        numbers = np.arange(start, start + n)
+        return pd.DataFrame({ID_COLUMN: [f'TPDM,114,訴,{i},20250101,1' for i in numbers],
+                             '法院名稱': '臺灣臺北地方法院', '裁判日期': '2025-01-01',
+                             '原始內容': [f'第{i}號判決' for i in numbers],
+                             '刑期(天)': (numbers % 3650 + 1).astype(float) if days is None else days})
+
+    embeddings = SimpleNamespace(model_name='random', version='1', normalization='none')
+    folder = tempfile.mkdtemp(prefix='index_bundle_')
+    try:
+        path = os.path.join(folder, 'bundle')
+        started = time.perf_counter()
+        base = vectors_near(rows)
+        edited_old = base[-1:].copy()
+        build_bundle(frame(0, rows), base, embeddings, path, ncentroids).close()
+        build_seconds = time.perf_counter() - started
+        del base
+
+        half = updates // 2
+        changed = frame(0, half, days=np.full(half, 99.0))  # 重新擷取後內容更正、刑期不同的判決（裁判書ID 不變）
+        changed['原始內容'] += '（更正）'
+        arrived = frame(rows, updates - half)
+        update_vectors = vectors_near(updates)
+        started = time.perf_counter()
+        with IndexBundle(path, writable=True) as bundle:
+            opened = time.perf_counter()
+            added, replaced = bundle.upsert(pd.concat([changed, arrived], ignore_index=True), update_vectors)
+            removed = bundle.remove(judgment_ids(frame(half, 100)))
+            updated = time.perf_counter()
+            bundle.save()
+            saved = time.perf_counter()
+            reasons = bundle.needs_retrain()
+            drift = bundle.drift()
+        print(f"📂 {rows} 筆 × {dim} 維，{ncentroids} 個聚類：整份重建 {build_seconds:.1f} 秒")
+        print(f"更新 {updates} 筆（新增 {added}、取代 {replaced}、移除 {removed}）：載入 {opened - started:.2f} 秒，"
+              f"更新 {updated - opened:.2f} 秒，寫回 {saved - updated:.2f} 秒，共 {saved - started:.2f} 秒")
+        print(f"📋 變化：{ {key: round(value, 3) for key, value in drift.items()} }，"
+              f"{'需要重新訓練：' + '；'.join(reasons) if reasons else '不需要重新訓練'}")
+
+        with IndexBundle(path) as bundle:
+            new_ids = judgment_ids(arrived).to_numpy()
+            _, found = bundle.search(update_vectors[half:half + 20], k=1)
+            ok = (len(bundle) == rows + added - removed
+                  and (found[:, 0] == new_ids[:20]).all()
+                  and (bundle.cases(judgment_ids(changed))['刑期(天)'] == 99).all()
+                  and bundle.cases(judgment_ids(frame(half, 100))).empty)
+        print("✅ 新增、取代與移除的結果正確" if ok else "❌ 更新結果不正確")
+
+        # 只更正一筆的原始內容：同一裁判書ID 取代原本的向量，總筆數不變，以舊向量查不到完全相同的向量
+        edited = frame(rows - 1, 1)
+        edited['原始內容'] += '（更正）'
+        edited_new = vectors_near(1)
+        with IndexBundle(path, writable=True) as bundle:
+            total = len(bundle)
+            counts = bundle.upsert(edited, edited_new)
+            bundle.save()
+        with IndexBundle(path) as bundle:
+            jid = int(judgment_ids(edited).iloc[0])
+            old_distance, _ = bundle.search(edited_old, k=1, nprobe=ncentroids)
+            new_distance, new_found = bundle.search(edited_new, k=1, nprobe=ncentroids)
+            ok = (counts == (0, 1) and len(bundle) == total and old_distance[0, 0] > 1e-6
+                  and new_found[0, 0] == jid and new_distance[0, 0] < 1e-6
+                  and bundle.cases([jid])['原始內容'].iloc[0].endswith('（更正）'))
+        print("✅ 更正原始內容後舊向量已移除、總筆數不變" if ok else "❌ 更正原始內容後的結果不正確")
+
+        with IndexBundle(path, writable=True) as bundle:
+            bundle.upsert(frame(rows * 2, shifted), vectors_near(shifted, offset=1.0))
+            reasons = bundle.needs_retrain()  # 不 save，關閉時捨棄
+        print(f"加入 {shifted} 筆偏離原分布的向量後："
+              f"{'✅ 提示重新訓練：' + '；'.join(reasons) if reasons else '❌ 沒有提示重新訓練'}")
+    finally:
+        shutil.rmtree(folder)
+
+
+def consult(bundle, model, k=NEIGHBORS, nprobe=NPROBE):
+    """互動查詢：輸入案情，列出相似判例與加權預估刑期"""
+    normalize = NORMALIZERS.get(bundle.info['normalization'])
+    print("\n== 智能刑期評估系統（預先建立的索引）==")
+    while True:
+        text = input("\n描述案情（輸入exit退出）: ")
+        if text.lower() == 'exit':
+            break
+        try:
+            vector = model.encode([normalize(text) if normalize else text])
+            predicted, cases = bundle.predict(vector, k, nprobe)
+            print("\n★ 相似判例分析:")
+            for _, case in cases.iterrows():
+                print(f"\n・{case['原始內容']}...")
+                print(f"  {case['法院名稱']} {case['裁判日期']} | 實際刑期：{case['刑期(天)']:.0f}天 | "
+                      f"相似度：{1 / (1 + case['距離']):.2%}")
+            if np.isnan(predicted):
+                print("\n基於相似判例，加權預估刑期為: 無法計算（數據異常）")
+            else:
+                print(f"\n基於相似判例，加權預估刑期為: {predicted:.2f} 天")
+        except Exception as e:
+            print(f"❌ 輸入錯誤: {e}，請重新輸入")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="建立或查詢相似判例索引")
+    parser.add_argument("--path", default=BUNDLE_PATH)
+    parser.add_argument("--build", action="store_true", help="以整份資料集中有刑期的判決建立索引")
+    parser.add_argument("--rebuild", action="store_true", help="資料未變也重新訓練")
+    parser.add_argument("--update", metavar="CSV",
+                        help="以正規化後的 CSV（與 Tovector.csv 相同欄位）更新索引：依裁判書ID，有刑期的加入或取代，沒有刑期的移除")
+    parser.add_argument("--benchmark", action="store_true", help="以隨機向量比較增量更新與整份重建")
+    parser.add_argument("--dataset", default="C:/Users/李/Desktop/數據分析/outputarea/Tovector",
+                        help="case_dataset 資料集路徑（--build 時使用）")
+    parser.add_argument("--model", default="DMetaSoul/sbert-chinese-general-v2")
+    parser.add_argument("--k", type=int, default=NEIGHBORS)
+    parser.add_argument("--nprobe", type=int, default=NPROBE)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        raise SystemExit
+
+    from embedding_server import load_model
+
+    if args.update:
+        from embedding_cache import EmbeddingCache
+
+        df = pd.read_csv(args.update, dtype={ID_COLUMN: str})
+        with IndexBundle(args.path, writable=True) as bundle:
+            model = load_model(bundle.info['model'])
+            if not bundle.check_model(model):
+                raise SystemExit(1)
+            has_sentence = df['刑期(天)'].fillna(0) > 0
+            with EmbeddingCache(model, bundle.info['model'], bundle.info['version']) as embeddings:
+                vectors = embeddings.encode(df.loc[has_sentence, '原始內容'].fillna('').tolist())
+            added, replaced = bundle.upsert(df[has_sentence], vectors)
+            removed = bundle.remove(judgment_ids(df[~has_sentence]))
+            bundle.save()
+            print(f"✅ 已更新 {args.path}：新增 {added}、取代 {replaced}、移除 {removed}，共 {len(bundle)} 筆")
+            reasons = bundle.needs_retrain()
+            if reasons:
+                print(f"⚠️ 建議以 --rebuild 重新訓練：{'；'.join(reasons)}")
+    elif args.build or args.rebuild:
+        from case_dataset import load_dataset
+        from embedding_cache import EmbeddingCache
+
+        df = load_dataset(args.dataset, columns=[ID_COLUMN, '法院名稱', '裁判日期', '原始內容', '刑期(天)'],
+                          filters=[('刑期(天)', '>', 0)])
+        model = load_model(args.model)
+        with EmbeddingCache(model, args.model) as embeddings:
+            vectors = embeddings.encode(df['原始內容'].fillna('').tolist())
+            build_bundle(df, vectors, embeddings, args.path, rebuild=args.rebuild).close()
+    else:
+        # 查詢端只開啟索引資料夾，不讀資料集、不訓練
+        started = time.perf_counter()
+        bundle = IndexBundle(args.path)
+        print(f"✅ 已開啟索引 {args.path}：{len(bundle)} 筆，{time.perf_counter() - started:.3f} 秒"
+              f"（{bundle.info['model']}，建立於 {bundle.info['built_at']}）")
+        model = load_model(bundle.info['model'])
+        bundle.check_model(model)
+        with bundle:
+            consult(bundle, model, args.k, args.nprobe)
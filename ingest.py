@@ -0,0 +1,210 @@
+import codecs
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import parse_log
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource，無法回報峰值記憶體
+    resource = None
+
+# importantcsv/ 的讀取層：每個檔案只偵測一次編碼，分塊讀取並逐塊處理，
+# 重複度高的字串欄位讀成 category，多個檔案時以多程序同時處理
+ENCODINGS = ('utf-8-sig', 'gbk')
+SAMPLE_BYTES = 1024 * 1024  # 偵測編碼時讀取的位元組數
+CHUNK_ROWS = 50_000
+# 法院、案件類型與罪名只有數十種值；原始內容、相關法條幾乎每列不同，維持字串
+CATEGORY_COLUMNS = ['法院名稱', '案件類型', '罪名']
+DTYPES = {column: 'category' for column in CATEGORY_COLUMNS}
+DTYPES['裁判書ID'] = str  # 裁判書ID 一律讀成字串，轉成 FAISS 的判決 ID 時才不會因型別不同而改變
+
+
+def detect_encoding(path, sample_bytes=SAMPLE_BYTES):
+    """以檔案開頭的樣本判斷編碼，不必為了換編碼重讀整個檔案"""
+    with open(path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    for encoding in ENCODINGS:
+        try:
+            # final=False：樣本結尾被切斷的多位元組字元不算錯誤
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def compact(df):
+    """數值欄位改用較小的型別；權重維持 float64，輸出的數值才會與原本相同"""
+    for column in df.columns:
+        if pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def concat_frames(frames, ignore_index=False):
+    """合併各塊資料，category 欄位先統一類別，合併後仍是 category 而不會退回字串"""
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True) if ignore_index else frames[0]
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.Index(dict.fromkeys(
+                value for frame in frames if column in frame for value in frame[column].cat.categories))
+            for frame in frames:
+                if column in frame:
+                    frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def memory_per_row(df):
+    return df.memory_usage(deep=True).sum() / len(df) if len(df) else 0
+
+
+def peak_rss_mb():
+    """本程序與已結束子程序的峰值常駐記憶體（MB），不支援時回傳 None"""
+    if resource is None:
+        return None
+    # Linux 的 ru_maxrss 單位是 KB，macOS 是位元組
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children) / 1024 ** 2
+
+
+def read_file(path, process=None, required=(), chunksize=CHUNK_ROWS):
+    """讀取單一 CSV，逐塊套用 process（例如 normalize_frame）再合併；
+    回傳 dict：file、frame、encoding、columns、rows、bytes_per_row、missing、error"""
+    result = {'file': os.path.basename(path), 'frame': None, 'encoding': None, 'columns': [],
+              'rows': 0, 'bytes_per_row': 0, 'missing': [], 'error': None}
+    for encoding in dict.fromkeys([detect_encoding(path), *ENCODINGS]):
+        try:
+            frames = _read_chunks(path, encoding, process, required, chunksize, result)
+        except UnicodeDecodeError as e:
+            # 樣本之後才出現無法解碼的位元組，只有這種情況才換編碼重讀
+            result['error'] = str(e)
+            continue
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+        result.update(encoding=encoding, error=None)
+        if not result['missing']:
+            frame = concat_frames(frames)
+            result.update(frame=frame, rows=len(frame), bytes_per_row=memory_per_row(frame))
+        return result
+    return result
+
+
+def _read_chunks(path, encoding, process, required, chunksize, result):
+    frames = []
+    with pd.read_csv(path, encoding=encoding, dtype=DTYPES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if not frames:
+                result['columns'] = chunk.columns.tolist()
+                result['missing'] = [column for column in required if column not in chunk.columns]
+                if result['missing']:
+                    return []
+            frames.append(compact(process(chunk) if process else chunk))
+    return frames
+
+
+def _read_file_in_worker(args):
+    """子程序的解析結果計數各自累計，連同讀取結果交回主程序"""
+    parse_log.stats.reset()
+    result = read_file(*args)
+    result['stats'] = (dict(parse_log.stats.counts), dict(parse_log.stats.samples))
+    return result
+
+
+def read_folder(folder, process=None, required=(), workers=None, chunksize=CHUNK_ROWS):
+    """讀取資料夾中所有 CSV，依檔名順序逐一產生 read_file 的結果；多個檔案時以 workers 個程序
+    同時處理（verbose 的逐列日誌只能由主程序寫入同一個檔案，此時改為單一程序）"""
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith('.csv')]
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1 or parse_log.verbose:
+        for path in paths:
+            yield read_file(path, process, required, chunksize)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = [(path, process, required, chunksize) for path in paths]
+        for result in pool.map(_read_file_in_worker, tasks):
+            counts, samples = result.pop('stats')
+            for outcome, count in counts.items():
+                parse_log.stats.add(outcome, count, samples.get(outcome, []))
+            yield result
+
+
+def _read_folder_whole(folder, process):
+    """原本的讀法：整個檔案一次讀入、推斷型別，失敗才換 gbk 從頭重讀；供比較用"""
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.csv'):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            df = pd.read_csv(path, encoding='utf-8-sig')
+        except UnicodeDecodeError:
+            df = pd.read_csv(path, encoding='gbk')
+        if '裁判日期' in df.columns:
+            frames.append(process(df))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    from datetime import datetime
+    from functools import partial
+
+    from normalize import normalize_frame
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        # 子程序：以指定方式讀取資料夾並正規化，回報耗時、每列記憶體與峰值記憶體
+        mode, folder, output, workers = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])
+        process = partial(normalize_frame, current_date=datetime(2026, 1, 1), sentence_days=True)
+        started = time.perf_counter()
+        if mode == 'whole':
+            df = _read_folder_whole(folder, process)
+        else:
+            df = concat_frames([result['frame'] for result in
+                                read_folder(folder, process, required=['裁判日期'], workers=workers)
+                                if result['frame'] is not None], ignore_index=True)
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mb()  # 寫出 CSV 前的峰值，只計讀取與正規化
+        df.to_csv(output, index=False, encoding='utf-8-sig')
+        print(f"{elapsed:.2f} {memory_per_row(df):.0f} {peak:.0f} {len(df)}")
+        sys.exit()
+
+    # 以 import.csv 複製出多個檔案（其中一個存成 gbk、一個缺少裁判日期欄位），
+    # 分別在獨立子程序中比較整檔讀取與分塊讀取的峰值記憶體，並確認輸出相同
+    csv_path = 'importantcsv/import.csv'
+    rows_per_file = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    base = pd.read_csv(csv_path, encoding='utf-8-sig')
+    big = pd.concat([base] * max(1, rows_per_file // len(base)), ignore_index=True)
+    folder = tempfile.mkdtemp(prefix='ingest_')
+    try:
+        for i in range(files):
+            encoding = 'gbk' if i == files - 1 else 'utf-8-sig'
+            big.to_csv(os.path.join(folder, f'part{i}.csv'), index=False, encoding=encoding, errors='replace')
+        base.drop(columns=['裁判日期']).to_csv(os.path.join(folder, 'no_date.csv'), index=False)
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder)) / 1024 ** 2
+        print(f"📂 {files} 個檔案，每個 {len(big)} 列，共 {size:.0f} MB")
+        outputs = {}
+        for mode, label in (('whole', '整檔讀取'), ('chunked', f'分塊讀取（{workers} 個程序）')):
+            outputs[mode] = os.path.join(folder, f'{mode}.out')
+            line = subprocess.run([sys.executable, __file__, '--run', mode, folder, outputs[mode], str(workers)],
+                                  capture_output=True, text=True, check=True).stdout.split()
+            print(f"{label}：{line[0]} 秒，每列 {line[1]} 位元組，峰值記憶體 {line[2]} MB，{line[3]} 列")
+        with open(outputs['whole'], 'rb') as a, open(outputs['chunked'], 'rb') as b:
+            print("✅ 輸出相同" if a.read() == b.read() else "❌ 輸出不同")
+    finally:
+        shutil.rmtree(folder)
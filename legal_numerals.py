@@ -0,0 +1,295 @@
+import re
+
+# 裁判書中的中文數字與刑期解析，tidy.py 與 Tovector 系列共用；
+# 所有正規表示式在匯入時編譯一次，整欄處理時相同內容只解析一次
+
+DIGITS = {
+    '零': 0, '〇': 0, '一': 1, '二': 2, '兩': 2, '三': 3, '四': 4,
+    '五': 5, '六': 6, '七': 7, '八': 8, '九': 9,
+    '壹': 1, '貳': 2, '參': 3, '叁': 3, '肆': 4, '伍': 5, '陸': 6, '柒': 7, '捌': 8, '玖': 9,
+    **{str(d): d for d in range(10)},
+    **{chr(0xFF10 + d): d for d in range(10)},  # 全形數字
+}
+SMALL_UNITS = {'十': 10, '拾': 10, '百': 100, '佰': 100, '千': 1000, '仟': 1000}
+SECTION_UNITS = {'萬': 10 ** 4, '億': 10 ** 8}
+
+NUMERAL_CHARS = "".join(DIGITS) + "".join(SMALL_UNITS) + "".join(SECTION_UNITS)
+NUMERAL = f"[{re.escape(NUMERAL_CHARS)}]"
+DAYS_PER_UNIT = {'年': 365, '月': 30, '日': 1}
+
+# 「數字＋年/月/日」一段刑期
+TERM_PATTERN = re.compile(rf"({NUMERAL}+)\s*([年月日])")
+_TERMS = rf"((?:{NUMERAL}+\s*年)?\s*(?:{NUMERAL}+\s*月)?\s*(?:{NUMERAL}+\s*日)?)"
+# 先找應執行刑，找不到才找宣告刑；都取最後一個
+SENTENCE_PATTERNS = [
+    re.compile(rf"應\s*執\s*行(?:.*?)(?:有期徒刑|拘役)\s*{_TERMS}"),
+    re.compile(rf"處(?:.*?)(?:有期徒刑|拘役)\s*{_TERMS}"),
+]
+WHITESPACE = re.compile(r"\s+")
+
+
+def chinese_to_number(text):
+    """中文數字（零–億，大小寫皆可）與阿拉伯數字混寫轉成整數；非數字字元略過，沒有數字時回傳 0"""
+    total = 0  # 已完成的「億」「萬」段
+    section = 0  # 目前萬以下的部分
+    current = 0  # 尚未乘上單位的數字
+    previous_digit = False
+    for char in text:
+        if char in DIGITS:
+            # 連續數字（如 40、二〇二五）依位數累加
+            current = current * 10 + DIGITS[char] if previous_digit else DIGITS[char]
+            previous_digit = True
+            continue
+        if char == ',' and previous_digit:  # 千分位逗號（1,000）
+            continue
+        previous_digit = False
+        if char in SMALL_UNITS:
+            section += (current or 1) * SMALL_UNITS[char]
+            current = 0
+        elif char == '萬':
+            total += (section + current or 1) * SECTION_UNITS[char]
+            section = current = 0
+        elif char == '億':
+            total = (total + section + current or 1) * SECTION_UNITS[char]
+            section = current = 0
+    return total + section + current
+
+
+def parse_terms(text):
+    """取出刑期中的各段 [(數字, 單位)]，例如「有期徒刑壹年陸月」→ [(1, '年'), (6, '月')]"""
+    return [(chinese_to_number(number), unit) for number, unit in TERM_PATTERN.findall(text)]
+
+
+def format_terms(terms, separator=""):
+    return separator.join(f"{number}{unit}" for number, unit in terms)
+
+
+def terms_to_days(terms):
+    """年以 365 日、月以 30 日計"""
+    return sum(number * DAYS_PER_UNIT[unit] for number, unit in terms)
+
+
+def format_sentence(text, default_unit=""):
+    """單一刑期字串正規化為「1年6月」；沒有年月日時以 default_unit 為單位"""
+    terms = parse_terms(text)
+    if terms:
+        return format_terms(terms)
+    return f"{chinese_to_number(text)}{default_unit}"
+
+
+def _missing(value):
+    return value is None or value != value or not value  # value != value 即 NaN
+
+
+def extract_terms(content):
+    """從裁判內容找出主文的刑期段落；找不到回傳 None，找到但沒有可解析的數字回傳 []"""
+    if _missing(content):
+        return None
+    content = WHITESPACE.sub(" ", str(content).strip())
+    for pattern in SENTENCE_PATTERNS:
+        matches = pattern.findall(content)
+        if matches:
+            return parse_terms(matches[-1])
+    return None
+
+
+def extract_sentence(content, unknown="未知"):
+    """刑期字串，格式與 Tovector 相同（「1年; 6月」），找不到時回傳 unknown"""
+    terms = extract_terms(content)
+    return unknown if terms is None else format_terms(terms, "; ")
+
+
+def extract_sentence_days(content):
+    """刑期總日數，找不到時回傳 0"""
+    terms = extract_terms(content)
+    return 0 if terms is None else terms_to_days(terms)
+
+
+def sentence_to_days(sentence):
+    """「1年; 6月」或「16月」等刑期字串轉成總日數；純數字視為日數；無法解析時回傳 0"""
+    if _missing(sentence) or sentence == '未知':
+        return 0
+    text = str(sentence).strip()
+    terms = parse_terms(text)
+    if terms:
+        return terms_to_days(terms)
+    # 沒有單位的部分（例如已換算好的日數）直接相加
+    return sum(int(float(part)) for part in text.split(';') if _is_number(part.strip()))
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return bool(text)
+
+
+def batch(func, values):
+    """整欄套用 func：相同值只計算一次；輸入為 Series 時回傳索引相同的 Series"""
+    import numpy as np
+    import pandas as pd
+
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    results = [func(value) for value in uniques]
+    results.append(func(None))  # 代碼 -1 為缺值
+    mapped = np.empty(len(results), dtype=object)
+    mapped[:] = results
+    out = pd.Series(mapped[codes], index=series.index, name=series.name)
+    return out.infer_objects() if isinstance(values, pd.Series) else out.tolist()
+
+
+def extract_sentences(contents, unknown="未知"):
+    """整欄的 extract_sentence"""
+    return batch(lambda content: extract_sentence(content, unknown), contents)
+
+
+def extract_sentences_days(contents):
+    """整欄的 extract_sentence_days"""
+    return batch(extract_sentence_days, contents)
+
+
+def sentences_to_days(sentences):
+    """整欄的 sentence_to_days"""
+    return batch(sentence_to_days, sentences)
+
+
+# 以下為整合前各模組的舊實作，只供 __main__ 的比對與效能測試使用
+_LEGACY_NUMS = {'零': 0, '壹': 1, '貳': 2, '參': 3, '肆': 4, '伍': 5, '陸': 6, '柒': 7, '捌': 8, '玖': 9,
+                '拾': 10, '佰': 100, '仟': 1000}
+
+
+def _legacy_tidy_number(text):
+    mapping = dict(_LEGACY_NUMS, 萬=10000)
+    num = 0
+    temp = 0
+    for char in text:
+        if char in mapping:
+            if char in '拾佰仟萬':
+                temp = temp or 1
+                num += temp * mapping[char]
+                temp = 0
+            else:
+                temp = mapping[char]
+    return num + temp if temp else num
+
+
+def _legacy_tovector_number(text):
+    if not text:
+        return text
+    num = 0
+    temp = 0
+    for char in text:
+        if char in _LEGACY_NUMS:
+            if char in '拾佰仟':
+                temp = (temp or 1) * _LEGACY_NUMS[char]
+            else:
+                temp += _LEGACY_NUMS[char]
+        else:
+            num += temp
+            temp = 0
+    num += temp
+    return str(num) if num > 0 else text
+
+
+def _legacy_extract_sentence(content):
+    if _missing(content):
+        return '未知'
+    content = re.sub(r'\s+', ' ', content.strip())
+    patterns = [
+        r'應\s*執\s*行(?:.*?)(?:有期徒刑|拘役)\s*((?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*年)?(?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*月)?(?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*日)?)',
+        r'處(?:.*?)(?:有期徒刑|拘役)\s*((?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*年)?(?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*月)?(?:[\d零壹貳參肆伍陸柒捌玖拾佰仟]+\s*日)?)'
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, content)
+        if matches:
+            parts = re.split(r'\s+', matches[-1].strip())
+            sentence_parts = []
+            for part in parts:
+                num = _legacy_tovector_number(re.sub(r'[年月日]', '', part))
+                for unit in '年月日':
+                    if unit in part:
+                        sentence_parts.append(f"{num}{unit}")
+                        break
+            return '; '.join(sentence_parts)
+    return '未知'
+
+
+# 標準答案：(輸入, 正確數值)
+GOLDEN_NUMBERS = [
+    ("零", 0), ("壹", 1), ("拾", 10), ("拾壹", 11), ("壹拾壹", 11), ("貳拾", 20), ("伍拾", 50),
+    ("壹佰", 100), ("壹佰零伍", 105), ("壹佰貳拾", 120), ("貳仟零壹拾", 2010), ("參仟伍佰", 3500),
+    ("壹萬", 10000), ("壹萬貳仟", 12000), ("拾伍萬", 150000), ("壹佰萬", 1000000), ("伍億", 500000000),
+    ("壹億貳仟萬", 120000000), ("二十", 20), ("兩百", 200), ("一千零一", 1001), ("40", 40),
+    ("1仟", 1000), ("3萬", 30000), ("1萬2千", 12000), ("1,000", 1000), ("１２", 12), ("二〇二五", 2025),
+]
+GOLDEN_SENTENCES = [
+    ("應執行有期徒刑拾壹月，如易科罰金", "11月", 330),
+    ("處拘役伍拾日，如易科罰金", "50日", 50),
+    ("應執行有期徒刑壹年陸月，併科罰金", "1年; 6月", 545),
+    ("處有期徒刑1年6月。", "1年; 6月", 545),
+    ("處有期徒刑 2 年 3 月", "2年; 3月", 820),
+    ("各處有期徒刑陸月，應執行有期徒刑壹年陸月", "1年; 6月", 545),
+    ("處拘役40日", "40日", 40),
+    ("上訴駁回。", "未知", 0),
+    (None, "未知", 0),
+]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+
+    failures = 0
+    for text, expected in GOLDEN_NUMBERS:
+        got = chinese_to_number(text)
+        if got != expected:
+            failures += 1
+            print(f"❌ chinese_to_number({text!r}) = {got}，應為 {expected}")
+    for content, sentence, days in GOLDEN_SENTENCES:
+        got = (extract_sentence(content), extract_sentence_days(content), sentence_to_days(extract_sentence(content)))
+        if got != (sentence, days, days):
+            failures += 1
+            print(f"❌ {content!r} → {got}，應為 {(sentence, days, days)}")
+    print(f"📋 標準答案 {len(GOLDEN_NUMBERS) + len(GOLDEN_SENTENCES)} 題，錯誤 {failures} 題")
+
+    # 與舊實作比較：只在舊實作本身正確（與標準答案相同）的題目上要求一致
+    legacy_failures = 0
+    for text, expected in GOLDEN_NUMBERS:
+        for legacy in (_legacy_tidy_number, _legacy_tovector_number):
+            old = legacy(text)
+            old = int(old) if str(old).isdigit() else old
+            if old == expected and chinese_to_number(text) != old:
+                legacy_failures += 1
+                print(f"❌ {legacy.__name__}({text!r}) 正確為 {old}，新版不一致")
+
+    # 以實際的 import.csv 原始內容比較舊版 extract_sentence_from_content 與新版，並量測速度
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "importantcsv/import.csv"
+    contents = pd.read_csv(csv_path, encoding="utf-8-sig")["原始內容"]
+    agree = differ = 0
+    for content in contents:
+        old, new = _legacy_extract_sentence(content), extract_sentence(content)
+        if old == new:
+            agree += 1
+        else:
+            differ += 1
+            if differ <= 5:
+                print(f"  舊 {old!r} / 新 {new!r}：{str(content)[:60]}")
+    print(f"📋 {len(contents)} 筆實際內容：一致 {agree} 筆，不同 {differ} 筆（舊版把「壹年陸月」併成一個數字、「壹佰貳拾」算成 1020 等）")
+
+    column = pd.concat([contents] * max(1, 100_000 // len(contents)), ignore_index=True)
+    started = time.perf_counter()
+    column.apply(_legacy_extract_sentence)
+    legacy_time = time.perf_counter() - started
+    started = time.perf_counter()
+    column.apply(extract_sentence)
+    row_time = time.perf_counter() - started
+    started = time.perf_counter()
+    extract_sentences(column)
+    batch_time = time.perf_counter() - started
+    print(f"📋 {len(column)} 列：舊版逐列 {legacy_time:.2f} 秒，新版逐列 {row_time:.2f} 秒"
+          f"（{legacy_time / row_time:.1f}x），整欄 {batch_time:.2f} 秒（{legacy_time / batch_time:.1f}x）")
+    sys.exit(1 if failures or legacy_failures else 0)
@@ -1,13 +1,15 @@
 import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression, Ridge 
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
+from case_dataset import load_dataset
+from embedding_cache import EmbeddingCache
+from embedding_server import load_model
+
 # 讀取數據
 try:
-    df = pd.read_csv('C:/Users/李/Desktop/數據分析/outputarea/Tovector.csv')
+    df = load_dataset('C:/Users/李/Desktop/數據分析/outputarea/Tovector', columns=['原始內容', '刑期(天)'], filters=[('刑期(天)', '>', 0)])
 except Exception as e:
     print(f"❌ 無法讀取數據文件: {e}")
     exit()
@@ -19,18 +21,22 @@ print(f"過濾後數據量: {len(df_with_sentence)} 行")
 
 # 載入嵌入模型
 try:
-    model = SentenceTransformer('DMetaSoul/sbert-chinese-general-v2')
+    model = load_model('DMetaSoul/sbert-chinese-general-v2')
     print("✅ 已載入通用模型：DMetaSoul/sbert-chinese-general-v2")
 except Exception as e:
     print(f"❌ 無法載入模型: {e}")
     exit()
 
+# 向量快取：同一段原始內容只送進模型一次，再次執行時直接讀取 embedding_cache/
+embeddings = EmbeddingCache(model, 'DMetaSoul/sbert-chinese-general-v2')
+
 # 處理文本向量
 try:
-    text_embeddings = model.encode(df_with_sentence["原始內容"].tolist())
+    text_embeddings = embeddings.encode(df_with_sentence["原始內容"].tolist())
 except Exception as e:
     print(f"❌ 文本向量化失敗: {e}")
     exit()
+print(f"📋 向量快取：{embeddings.report()}")
 
 # 準備特徵和標籤
 X = text_embeddings
@@ -0,0 +1,89 @@
+import json
+import sqlite3
+import time
+
+# tidy.py 的整理紀錄：每個來源檔的簽章（大小與修改時間）、內容雜湊與整理出的資料列，
+# 重新執行時只整理新增或內容有變的來源，輸出檔由這裡保存的資料列重新產生
+DEFAULT_PATH = "tidy_manifest.sqlite"
+
+
+class Manifest:
+    """以 SQLite 保存的來源檔清單與對應資料列"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                sort_key INTEGER NOT NULL,
+                signature TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                row_id TEXT,
+                row TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_sort ON sources(sort_key)")
+        self.conn.commit()
+        # 啟動時一次載入簽章與雜湊，比對時不必逐筆查詢
+        self.entries = {
+            source: (signature, digest)
+            for source, signature, digest in self.conn.execute("SELECT source, signature, digest FROM sources")
+        }
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def sources(self):
+        return set(self.entries)
+
+    def unchanged(self, source, signature):
+        """簽章相同即視為未變更，不必讀檔"""
+        entry = self.entries.get(source)
+        return entry is not None and entry[0] == signature
+
+    def same_digest(self, source, digest):
+        entry = self.entries.get(source)
+        return entry is not None and entry[1] == digest
+
+    def touch(self, source, sort_key, signature):
+        """內容沒變只是簽章變了（例如重新複製檔案），更新簽章與排序即可"""
+        self.conn.execute(
+            "UPDATE sources SET sort_key = ?, signature = ? WHERE source = ?", (sort_key, signature, source)
+        )
+        self.entries[source] = (signature, self.entries[source][1])
+
+    def upsert(self, source, sort_key, signature, digest, row_id, row):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sources (source, sort_key, signature, digest, row_id, row, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, sort_key, signature, digest, row_id, json.dumps(row, ensure_ascii=False), time.time()),
+        )
+        self.entries[source] = (signature, digest)
+
+    def remove(self, sources):
+        """刪除已不存在的來源及其資料列"""
+        self.conn.executemany("DELETE FROM sources WHERE source = ?", [(source,) for source in sources])
+        for source in sources:
+            self.entries.pop(source, None)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rows(self):
+        """依來源順序逐筆產生資料列"""
+        for (row,) in self.conn.execute("SELECT row FROM sources ORDER BY sort_key, source"):
+            yield json.loads(row)
@@ -0,0 +1,231 @@
+import logging
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import legal_numerals
+import parse_log
+
+# Tovector 系列的正規化階段：裁判日期轉西元、時間權重、刑期與刑期天數。
+# 逐列版本保留作為對照，整欄版本以 Series.str 與陣列運算處理整個檔案
+
+FULL_DATE = re.compile(r'民國 (\d+) 年 (\d+) 月 (\d+) 日')
+YEAR_ONLY = re.compile(r'民國 (\d+) 年')
+MIN_WEIGHT = 0.01
+# 阿拉伯數字以外的數字字元；含這些字元的刑期交給 legal_numerals 逐值解析
+NON_ARABIC = "[" + re.escape("".join(c for c in legal_numerals.NUMERAL_CHARS if not "0" <= c <= "9")) + "]"
+
+
+def parse_judgment_date(date_str):
+    """解析裁判日期，支持只有年份的格式"""
+    try:
+        date_str = date_str.strip()
+        match_full = FULL_DATE.search(date_str)
+        if match_full:
+            year = int(match_full.group(1)) + 1911
+            month = int(match_full.group(2))
+            day = int(match_full.group(3))
+            parsed = datetime(year, month, day)
+        else:
+            match_year = YEAR_ONLY.search(date_str)
+            if not match_year:
+                parse_log.record("無法解析的日期", date_str)
+                return None
+            year = int(match_year.group(1)) + 1911
+            parsed = datetime(year, 1, 1)
+        parse_log.record("成功解析日期", level=logging.DEBUG)
+        return parsed
+    except Exception as e:
+        parse_log.record("解析日期時發生錯誤", f"{e}, 日期: {date_str}", logging.ERROR)
+        return None
+
+
+def calculate_weight(file_date, current_date):
+    """根據日期計算權重"""
+    days_difference = (current_date - file_date).days
+    return max(1 / (1 + days_difference), MIN_WEIGHT)
+
+
+def convert_sentence_to_days(sentence):
+    """將刑期轉換為天數，支援帶單位的刑期，並處理無效輸入"""
+    return legal_numerals.sentence_to_days(sentence)
+
+
+def extract_sentence_from_content(content):
+    """從原始內容中提取刑期，保留單位"""
+    if pd.isna(content) or not content:
+        parse_log.record("原始內容為空，無法提取刑期")
+        return '未知'
+    extracted = legal_numerals.extract_sentence(content, unknown=None)
+    if extracted is None:
+        parse_log.record("無法從內容提取刑期", content, logging.WARNING)
+        return '未知'
+    if not extracted:  # 有判決主文的句型但沒有任何年月日
+        parse_log.record("無法從內容提取刑期", content, logging.WARNING)
+        return extracted
+    parse_log.record("成功提取刑期", extracted)
+    return extracted
+
+
+def extract_sentence_days_from_content(content):
+    """從原始內容中提取刑期，直接返回總日數"""
+    if pd.isna(content) or not content:
+        parse_log.record("原始內容為空，無法提取刑期")
+        return 0
+    terms = legal_numerals.extract_terms(content)
+    if terms is None:
+        parse_log.record("無法從內容提取刑期", content, logging.WARNING)
+        return 0
+    total_days = legal_numerals.terms_to_days(terms)
+    if not total_days:
+        parse_log.record("無法從內容提取刑期", content, logging.WARNING)
+        return total_days
+    parse_log.record("成功提取刑期", f"{total_days}日")
+    return total_days
+
+
+def _by_unique(values, func, missing):
+    """對欄位中的相異值做一次 func（回傳等長陣列），再依代碼展開回每一列；缺值填 missing"""
+    codes, uniques = pd.factorize(values)
+    computed = func(pd.Series(uniques, dtype=object))
+    return np.append(computed, np.array([missing], dtype=computed.dtype))[codes]
+
+
+def parse_judgment_dates(dates):
+    """整欄的 parse_judgment_date，回傳 datetime64；無法解析的為 NaT"""
+    return pd.Series(_by_unique(dates, _parse_dates, np.datetime64("NaT", "ns")), index=dates.index)
+
+
+def _parse_dates(dates):
+    text = dates.where(dates.map(type) == str).str.strip()
+    full = text.str.extract(FULL_DATE).astype("float64")
+    year = full[0].fillna(text.str.extract(YEAR_ONLY)[0].astype("float64"))
+    parts = pd.DataFrame({"year": year + 1911, "month": full[1].fillna(1), "day": full[2].fillna(1)})
+    # 不存在的日期（例如 2 月 30 日）與逐列版本一樣視為無法解析
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype="datetime64[ns]")
+    valid = parts.dropna()
+    if len(valid):
+        parsed.loc[valid.index] = pd.to_datetime(valid, errors="coerce")
+    return parsed.to_numpy()
+
+
+def calculate_weights(dates, current_date):
+    """整欄的 calculate_weight"""
+    days = (pd.Timestamp(current_date) - dates).dt.days.to_numpy(dtype="float64")
+    with np.errstate(divide="ignore"):
+        return pd.Series(np.maximum(1 / (1 + days), MIN_WEIGHT), index=dates.index)
+
+
+def sentences_to_days(sentences):
+    """整欄的 convert_sentence_to_days：只含阿拉伯數字的「1年; 6月」一次取出所有段落加總，
+    其餘（中文數字、沒有單位的日數、未知）交給 legal_numerals 逐值解析"""
+    if pd.api.types.is_numeric_dtype(sentences):  # 已是日數（Tovecter2 的刑期欄）
+        return sentences.fillna(0).astype("int64")
+    return pd.Series(_by_unique(sentences, _sentences_to_days, 0), index=sentences.index)
+
+
+def _sentences_to_days(sentences):
+    text = sentences.where(sentences.map(type) == str)
+    terms = text.str.extractall(r"([0-9]+)\s*([年月日])")
+    has_terms = text.str.contains(r"[0-9]\s*[年月日]", na=False) & ~text.str.contains(NON_ARABIC, na=False)
+    result = pd.Series(0, index=sentences.index, dtype="int64")
+    if len(terms):
+        days = terms[0].astype("int64") * terms[1].map(legal_numerals.DAYS_PER_UNIT)
+        summed = days.groupby(level=0).sum()
+        summed = summed[has_terms.reindex(summed.index)]
+        result.loc[summed.index] = summed
+    rest = ~has_terms
+    if rest.any():
+        result.loc[rest] = legal_numerals.sentences_to_days(sentences[rest]).astype("int64")
+    return result.to_numpy()
+
+
+def _record_dates(dates, parsed):
+    """整欄日期解析的結果計數，分類與逐列版本相同"""
+    failed = parsed.isna()
+    parse_log.stats.add("成功解析日期", int((~failed).sum()))
+    if failed.any():
+        dates = dates[failed]
+        # 找得到年份卻不是有效日期（例如 2 月 30 日）或不是字串，逐列版本會拋出例外
+        is_text = dates.map(type) == str
+        has_year = dates.where(is_text).str.contains(r'民國 \d+ 年', na=False).astype(bool)
+        parse_log.record_many("無法解析的日期", dates[is_text & ~has_year])
+        parse_log.record_many("解析日期時發生錯誤", dates[~is_text | has_year], logging.ERROR)
+
+
+def _record_sentences(contents, sentences, sentence_days):
+    empty = contents.isna() | (contents.astype(object) == "")
+    found = sentences != 0 if sentence_days else ~sentences.isin(['未知', ''])
+    parse_log.record_many("原始內容為空，無法提取刑期", contents[empty], examples=False)
+    parse_log.record_many("無法從內容提取刑期", contents[~found & ~empty], logging.WARNING)
+    parse_log.record_many("成功提取刑期", sentences[found], suffix="日" if sentence_days else "")
+
+
+def normalize_frame(df, current_date, sentence_days=False):
+    """整欄版本：日期、權重、刑期、刑期天數；sentence_days 時刑期欄直接存總日數（Tovecter2）"""
+    dates = df['裁判日期']
+    df['裁判日期'] = parse_judgment_dates(dates)
+    _record_dates(dates, df['裁判日期'])
+    df = df.dropna(subset=['裁判日期'])
+    df['權重'] = calculate_weights(df['裁判日期'], current_date)
+    if '刑期' in df.columns:
+        if '原始內容' in df.columns:
+            if sentence_days:
+                df['刑期'] = legal_numerals.extract_sentences_days(df['原始內容'])
+            else:
+                df['刑期'] = legal_numerals.extract_sentences(df['原始內容'])
+            _record_sentences(df['原始內容'], df['刑期'], sentence_days)
+        if sentence_days:
+            df['刑期'] = df['刑期'].fillna(0)
+        df['刑期(天)'] = sentences_to_days(df['刑期'])
+    return df
+
+
+def normalize_frame_rowwise(df, current_date, sentence_days=False):
+    """逐列版本，與整欄版本的結果相同，保留作為對照"""
+    df['裁判日期'] = df['裁判日期'].apply(parse_judgment_date)
+    df = df.dropna(subset=['裁判日期'])
+    df['權重'] = df['裁判日期'].apply(lambda x: calculate_weight(x, current_date))
+    if '刑期' in df.columns:
+        if '原始內容' in df.columns:
+            extract = extract_sentence_days_from_content if sentence_days else extract_sentence_from_content
+            df['刑期'] = df['原始內容'].apply(extract)
+        if sentence_days:
+            df['刑期'] = df['刑期'].fillna(0)
+        df['刑期(天)'] = df['刑期'].apply(convert_sentence_to_days)
+    return df
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # 以 import.csv 複製到指定列數，比較逐列與整欄版本的輸出與耗時
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "importantcsv/import.csv"
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    logging.disable(logging.CRITICAL)  # 只比較運算本身，不寫日誌
+    base = pd.read_csv(csv_path, encoding="utf-8-sig")
+    # 加入幾種邊界情況：只有年份、不存在的日期、空值、中文數字刑期
+    extra = base.head(4).copy()
+    extra['裁判日期'] = ['民國 113 年', '民國 113 年 02 月 30 日', None, '不明']
+    extra['原始內容'] = ['應執行有期徒刑 壹年 陸月', None, '上訴駁回。', '處拘役40日']
+    base = pd.concat([base, extra], ignore_index=True)
+    frame = pd.concat([base] * max(1, rows // len(base)), ignore_index=True)
+    current_date = datetime.now()
+    for sentence_days in (False, True):
+        started = time.perf_counter()
+        expected = normalize_frame_rowwise(frame.copy(), current_date, sentence_days)
+        row_time = time.perf_counter() - started
+        started = time.perf_counter()
+        got = normalize_frame(frame.copy(), current_date, sentence_days)
+        column_time = time.perf_counter() - started
+        try:
+            pd.testing.assert_frame_equal(expected, got, check_dtype=False)
+            same = "相同"
+        except AssertionError as e:
+            same = f"不同：{e}"
+        label = "刑期天數" if sentence_days else "刑期字串"
+        print(f"📋 {label}，{len(frame)} 列：逐列 {row_time:.2f} 秒，整欄 {column_time:.2f} 秒"
+              f"（{row_time / column_time:.1f}x），輸出{same}")
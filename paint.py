@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-df = pd.read_csv('C:/Users/李/Desktop/數據分析/outputarea/Tovector.csv')
+from case_dataset import load_dataset
+
+df = load_dataset('C:/Users/李/Desktop/數據分析/outputarea/Tovector', columns=['刑期(天)'], filters=[('刑期(天)', '>', 0)])
 
 df = df[df['刑期(天)'] != '未知']
 df['刑期(天)'] = pd.to_numeric(df['刑期(天)'], errors='coerce')
@@ -0,0 +1,159 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import Counter
+
+# 正規化階段的日誌：根記錄器只把紀錄放進佇列，由背景執行緒寫檔，主迴圈不會卡在檔案 I/O；
+# 逐列結果平常只累計成各結果的筆數與少量例子，結束時印出統計表，verbose 時才逐列寫入日誌
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+SAMPLE_SIZE = 3  # 每種結果保留的例子數
+SAMPLE_WIDTH = 40  # 統計表中每個例子最多顯示的字數
+
+verbose = False
+_listener = None
+
+
+class ParseStats:
+    """各解析結果的筆數與前幾個相異的例子"""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.counts = Counter()
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, outcome, count=1, examples=()):
+        with self._lock:
+            self.counts[outcome] += count
+            samples = self.samples.setdefault(outcome, [])
+            for example in examples:
+                if len(samples) >= self.sample_size:
+                    break
+                if example not in samples:
+                    samples.append(example)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.samples.clear()
+
+    def table(self):
+        """統計表的各行文字，筆數多的在前"""
+        lines = []
+        width = max((len(str(count)) for count in self.counts.values()), default=1)
+        for outcome, count in self.counts.most_common():
+            examples = " | ".join(_shorten(example) for example in self.samples.get(outcome, []))
+            lines.append(f"{count:>{width}}  {outcome}" + (f"  例：{examples}" if examples else ""))
+        return lines
+
+
+def _shorten(example):
+    text = " ".join(str(example).split())
+    return text if len(text) <= SAMPLE_WIDTH else text[:SAMPLE_WIDTH] + "…"
+
+
+stats = ParseStats()
+
+
+def record(outcome, example=None, level=logging.INFO):
+    """逐列結果：累計筆數與例子；verbose 時另外寫一行「結果: 例子」到日誌"""
+    stats.add(outcome, 1, () if example is None else (example,))
+    if verbose:
+        logging.log(level, outcome if example is None else f"{outcome}: {example}")
+
+
+def record_many(outcome, values, level=logging.INFO, suffix="", examples=True):
+    """整欄結果：values 為得到該結果的所有值（Series），一次累計；
+    例子只從前面幾筆取，verbose 時才逐筆寫入日誌（與逐列版本相同的訊息）"""
+    if not len(values):
+        return
+    head = values.head(100).drop_duplicates().head(stats.sample_size) if examples else ()
+    stats.add(outcome, len(values), [f"{value}{suffix}" for value in head])
+    if verbose:
+        for value in values:
+            logging.log(level, f"{outcome}: {value}{suffix}" if examples else outcome)
+
+
+def setup_logging(filename, verbose_rows=False, level=logging.INFO):
+    """取代 logging.basicConfig：根記錄器改用 QueueHandler，由 QueueListener 在背景寫入 filename"""
+    global verbose, _listener
+    stop_logging()
+    verbose = verbose_rows
+    stats.reset()
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(filename, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+
+
+def stop_logging():
+    """等背景執行緒把佇列寫完再關閉檔案"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def summary(title="解析結果統計"):
+    """印出統計表並寫入日誌，再關閉背景寫檔"""
+    lines = stats.table()
+    print(f"📋 {title}")
+    for line in lines or ["（無紀錄）"]:
+        print("  " + line)
+    logging.info(f"{title}：" + "；".join(lines))
+    stop_logging()
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    import time
+    from datetime import datetime
+
+    import pandas as pd
+
+    import normalize
+    import parse_log  # normalize 用的是匯入的模組，不是這個 __main__
+
+    # 以逐列版本的正規化比較三種日誌方式：同步寫檔（原本的 basicConfig）、佇列逐列、佇列只計數
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "importantcsv/import.csv"
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    base = pd.read_csv(csv_path, encoding="utf-8-sig")
+    frame = pd.concat([base] * max(1, rows // len(base)), ignore_index=True)
+    current_date = datetime.now()
+    log_dir = tempfile.mkdtemp(prefix="parse_log_")
+    expected = None
+    for label, mode in (("同步寫檔逐列", "sync"), ("佇列逐列", "queue"), ("佇列只計數", "counters")):
+        log_path = os.path.join(log_dir, f"{mode}.log")
+        if mode == "sync":
+            logging.basicConfig(filename=log_path, level=logging.INFO, format=LOG_FORMAT, encoding='utf-8')
+            parse_log.verbose = True
+        else:
+            parse_log.setup_logging(log_path, verbose_rows=mode == "queue")
+        started = time.perf_counter()
+        got = normalize.normalize_frame_rowwise(frame.copy(), current_date)
+        elapsed = time.perf_counter() - started
+        if mode == "counters":
+            parse_log.summary()
+        parse_log.stop_logging()
+        with open(log_path, encoding="utf-8") as f:
+            log_lines = sum(1 for _ in f)
+        same = expected is None or got.equals(expected)
+        expected = got if expected is None else expected
+        print(f"{label}：{len(frame)} 列 {elapsed:.2f} 秒，日誌 {log_lines} 行，輸出{'相同' if same else '不同'}")
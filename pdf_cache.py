@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 裁判書 PDF 本地快取：以 hlExportPDF 連結的雜湊為檔名，重新整理時不必再下載；
+# 總大小超過上限時依最後使用時間淘汰（LRU，使用時間記在檔案的修改時間上）
+BASE_URL = "https://judgment.judicial.gov.tw"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_CONCURRENCY = 4  # 同時下載數上限
+LOW_WATER = 0.9  # 超過上限時淘汰到上限的 90%，之後不必每次下載都掃描
+SCAN_FRACTION = 16  # 本程序下載累計超過上限的 1/16 時重新掃描資料夾，計入其他程序下載的檔案
+
+_local = threading.local()
+
+
+def get_session(concurrency=DEFAULT_CONCURRENCY):
+    """每個執行緒共用一個保持連線的 Session"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+class PdfCache:
+    """以連結雜湊定址的 PDF 快取；get 命中時直接回傳本地路徑，未命中才下載。
+    semaphore 為多個程序共用的下載名額（例如 multiprocessing.BoundedSemaphore），不給時只限制本程序"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, base_url=BASE_URL, concurrency=DEFAULT_CONCURRENCY,
+                 semaphore=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.base_url = base_url
+        self.semaphore = semaphore or threading.BoundedSemaphore(concurrency)
+        self.concurrency = concurrency
+        self.hits = 0
+        self.downloads = 0
+        self.scans = 0
+        # 資料夾總大小只在第一次下載與淘汰時掃描，之後依下載的大小累加
+        self._total = None
+        self._since_scan = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, href):
+        return hashlib.sha1(href.encode("utf-8")).hexdigest()
+
+    def local_path(self, href):
+        return os.path.join(self.path, self.key(href) + ".pdf")
+
+    def __contains__(self, href):
+        return os.path.exists(self.local_path(href))
+
+    def get(self, href, timeout=10):
+        """回傳 PDF 的本地路徑；快取中沒有時下載，下載失敗時拋出例外"""
+        path = self.local_path(href)
+        if os.path.exists(path):
+            os.utime(path)  # 更新最後使用時間
+            self.hits += 1
+            return path
+        url = href if href.startswith("http") else self.base_url + href
+        with self.semaphore:
+            response = get_session(self.concurrency).get(url, timeout=timeout)
+            response.raise_for_status()
+        # 先寫暫存檔再改名，避免中斷或多程序同時下載時留下不完整的檔案
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(temp_path, path)
+        self.downloads += 1
+        with self._lock:
+            if self._total is None:
+                self._total = self.size()
+            else:
+                self._total += len(response.content)
+            self._since_scan += len(response.content)
+            if self._total > self.max_bytes or self._since_scan * SCAN_FRACTION > self.max_bytes:
+                self.evict()
+        return path
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.path, f)) for f in os.listdir(self.path) if f.endswith(".pdf"))
+
+    def evict(self):
+        """掃描資料夾，總大小超過上限時從最久未使用的檔案開始刪除，直到低於上限的 LOW_WATER"""
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(".pdf"):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:  # 其他程序剛淘汰
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * LOW_WATER if total > self.max_bytes else total
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:  # 其他程序正在使用或已刪除
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        self._since_scan = 0
+        self.scans += 1
+        return removed
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # 以本地替身伺服器驗證：第二次讀取同一批連結不會發出任何請求，超過上限時淘汰最舊的
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            body = b"%PDF-1.4\n" + self.path.encode("utf-8") * 100
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix="pdf_cache_")
+    try:
+        hrefs = [f"/FILES/case_{i}.pdf" for i in range(20)]
+        cache = PdfCache(cache_dir, base_url=f"http://127.0.0.1:{server.server_port}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(cache.concurrency) as pool:
+            list(pool.map(cache.get, hrefs))
+        failed = [href for href in hrefs if href not in cache]
+        print(f"第一次：{len(requests_seen)} 次請求，失敗 {len(failed)} 筆，掃描資料夾 {cache.scans} 次，"
+              f"耗時 {time.perf_counter() - started:.2f} 秒")
+        before = len(requests_seen)
+        for href in hrefs:
+            cache.get(href)
+        print(f"第二次：{len(requests_seen) - before} 次請求，命中 {cache.hits} 筆")
+
+        small = PdfCache(cache_dir, max_bytes=cache.size() // 2, base_url=cache.base_url)
+        small.evict()
+        kept = sum(href in small for href in hrefs)
+        print(f"上限減半後保留 {kept}/{len(hrefs)} 份，共 {small.size()} 位元組")
+
+        # 快取已滿時持續下載：大小維持在上限內，且只偶爾掃描資料夾
+        full = PdfCache(tempfile.mkdtemp(dir=cache_dir), max_bytes=200_000, base_url=cache.base_url)
+        more = [f"/FILES/more_{i}.pdf" for i in range(300)]
+        for href in more:
+            full.get(href)
+        print(f"上限 {full.max_bytes} 位元組下載 {len(more)} 份：保留 {full.size()} 位元組，掃描資料夾 {full.scans} 次")
+        ok = (len(requests_seen) == before + len(more) and not failed and 0 < kept < len(hrefs)
+              and full.size() <= full.max_bytes and full.scans < len(more) // 5)
+        print("✅ 快取驗證通過" if ok else "❌ 快取驗證失敗")
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+# 自適應限速器與計時統計：依回應延遲與錯誤率調整請求速率，取代固定的 time.sleep
+
+
+class AdaptiveRateLimiter:
+    """令牌桶限速器；回應快且成功時加速，變慢或出錯時減速（AIMD）"""
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, burst=4,
+                 target_latency=2.0, increase=0.2, decrease=0.5):
+        self.rate = rate  # 每秒可發出的請求數
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.burst = burst
+        self.target_latency = target_latency  # 超過此延遲（秒）視為伺服器吃緊
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """取出一個令牌，回傳需要等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        """同步等待一個令牌（給 Selenium 流程使用）"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        """非同步等待一個令牌（給 fetcher 使用）"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record(self, latency, ok=True):
+        """回報一次請求結果，據此調整速率"""
+        with self.lock:
+            if not ok or latency > self.target_latency:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class TimingStats:
+    """各階段的計時計數器：次數、總耗時、最大耗時、錯誤數"""
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, elapsed, ok=True):
+        with self.lock:
+            entry = self.stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["total"] += elapsed
+            entry["max"] = max(entry["max"], elapsed)
+            if not ok:
+                entry["errors"] += 1
+
+    @contextmanager
+    def timed(self, name):
+        """以 with 區塊計時，區塊內拋出例外時記為錯誤"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.add(name, time.perf_counter() - started, ok=False)
+            raise
+        self.add(name, time.perf_counter() - started)
+
+    def summary(self):
+        """印出各階段耗時統計表"""
+        print(f"\n{'階段':<16}{'次數':>8}{'總耗時(秒)':>12}{'平均(秒)':>10}{'最大(秒)':>10}{'錯誤':>6}")
+        for name, entry in sorted(self.stats.items(), key=lambda kv: -kv[1]["total"]):
+            average = entry["total"] / entry["count"] if entry["count"] else 0
+            print(f"{name:<16}{entry['count']:>8}{entry['total']:>12.2f}{average:>10.3f}{entry['max']:>10.3f}{entry['errors']:>6}")
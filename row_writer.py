@@ -0,0 +1,106 @@
+import csv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 沒有 pyarrow 時只能輸出 CSV
+    pa = pq = None
+
+# 分批寫出資料列：先寫到 *.partial，每累積 batch_size 筆就寫出一次，
+# 全部完成後才以 os.replace 換成正式檔名，中途失敗不會留下寫到一半的輸出檔
+DEFAULT_BATCH_SIZE = 1000
+
+
+class RowWriter:
+    """依副檔名寫成 CSV（utf-8-sig）或 Parquet；記憶體中最多只保留一批資料列"""
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.batch_size = batch_size
+        self.parquet = path.endswith(".parquet")
+        if self.parquet and pq is None:
+            raise RuntimeError("輸出 Parquet 需要安裝 pyarrow")
+        self.columns = None
+        self.buffer = []
+        self.count = 0
+        self._file = None
+        self._writer = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.columns is None:
+            self.columns = list(self.buffer[0])
+        if self.parquet:
+            self._flush_parquet()
+        else:
+            self._flush_csv()
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def _flush_csv(self):
+        if self._writer is None:
+            # 與 DataFrame.to_csv 相同的格式：BOM、最小引號、系統換行
+            self._file = open(self.partial_path, "w", encoding="utf-8-sig", newline="")
+            self._writer = csv.writer(self._file, lineterminator=os.linesep)
+            self._writer.writerow(self.columns)
+        self._writer.writerows([[row.get(column, "") for column in self.columns] for row in self.buffer])
+        self._file.flush()
+
+    def _flush_parquet(self):
+        # 每批寫成一個 row group，所有欄位皆為字串
+        table = pa.table({column: [row.get(column) for row in self.buffer] for column in self.columns},
+                         schema=pa.schema([(column, pa.string()) for column in self.columns]))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.partial_path, table.schema)
+        self._writer.write_table(table)
+
+    def finalize(self):
+        """寫出剩餘的資料列並原子地換成正式檔名，回傳總筆數"""
+        self.flush()
+        if self._writer is None:  # 沒有任何資料列時仍產生只有表頭的空檔
+            self.columns = self.columns or []
+            if self.parquet:
+                self._writer = pq.ParquetWriter(self.partial_path, pa.schema([]))
+            else:
+                self._flush_csv()
+        self._close()
+        os.replace(self.partial_path, self.path)
+        return self.count
+
+    def abort(self):
+        """放棄這次輸出，刪除暫存檔，正式檔維持原狀"""
+        self.buffer = []
+        self._close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def _close(self):
+        if self._writer is not None and self.parquet:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.abort()
@@ -5,9 +5,34 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+import asyncio
 import time
 from selenium.webdriver.common.proxy import Proxy, ProxyType
 
+import fetcher
+from frontier import Frontier, FETCHED, judgment_id_from_url
+from ratelimit import AdaptiveRateLimiter, TimingStats
+from archive import JudgmentArchive
+from compact_record import DETAIL_READY, store_page
+
+# 抓取模式："http" 只用瀏覽器送出搜尋，詳細頁改以並行 HTTP 下載；
+# "pool" 以多個無頭瀏覽器平行處理結果頁（網站需要 JavaScript 時）；"selenium" 為舊的點擊/返回流程
+FETCH_MODE = "http"
+POOL_WORKERS = 4  # "pool" 模式的瀏覽器數量
+POOL_PAGES = 25  # "pool" 模式要處理的結果列表頁數
+CONCURRENCY = 8  # 並行下載數
+FRONTIER_PATH = "crawl_frontier.sqlite"  # 爬取佇列，重新啟動時自動續抓
+ARCHIVE_DIR = None  # 設定資料夾路徑時，詳細頁寫入壓縮封存庫而非個別 case_*_detail.html
+COMPACT_RECORDS = True  # 只儲存裁判書本體的精簡紀錄，捨棄網站版面
+KEEP_HTML = False  # 精簡紀錄中是否一併保留原始 HTML
+INCREMENTAL = False  # 增量模式：結果依日期由新到舊，遇到已抓取過的裁判書就停止，並輸出本次新增清單
+MAX_CONSECUTIVE_ERRORS = 5  # 連續失敗超過此數才中止
+INITIAL_RATE = 1.0  # 初始每秒請求數，之後依回應延遲與錯誤自動調整
+
+limiter = AdaptiveRateLimiter(rate=INITIAL_RATE, max_rate=5.0, target_latency=5.0)
+stats = TimingStats()
+TOR_PROXY = "socks5://127.0.0.1:9050"
+
 proxy = Proxy()
 proxy.proxy_type = ProxyType.MANUAL
 proxy.socks_proxy = '127.0.0.1:9050'  # Tor 的 SOCKS5 代理端口
@@ -19,11 +44,15 @@ options.add_argument('--proxy-server=socks5://127.0.0.1:9050')  # 設置 SOCKS5
 options.add_argument('--user-agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"')
 options.headless =True  # 設 True 可隱藏瀏覽器
 
-# 使用 Service 和 ChromeOptions 啟動 Chrome 瀏覽器
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
 
-driver.get('http://check.torproject.org')  # 檢查是否通過 Tor 網絡
-try:
+def create_driver(driver_options=options):
+    """使用 Service 和 ChromeOptions 啟動 Chrome 瀏覽器"""
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=driver_options)
+
+
+def open_search(driver, keyword="判決書"):
+    """進入裁判書查詢系統並送出關鍵字搜尋"""
+    driver.get('http://check.torproject.org')  # 檢查是否通過 Tor 網絡
     # 進入裁判書查詢系統
     driver.get("https://judgment.judicial.gov.tw/FJUD/default.aspx")
     
@@ -37,23 +66,57 @@ try:
         EC.presence_of_element_located((By.NAME, "txtKW"))
     )
     search_box.clear()
-    search_box.send_keys("判決書")
+    search_box.send_keys(keyword)
     search_box.send_keys(Keys.RETURN)
     
-    # 等待搜尋結果頁面載入
-    time.sleep(5)  # 等待幾秒鐘以確保搜尋結果載入完成
-    
+    # 等待搜尋結果載入：iframe 出現且其中已有裁判書連結
+    with stats.timed("search"):
+        WebDriverWait(driver, 30).until(
+            EC.frame_to_be_available_and_switch_to_it((By.ID, "iframe-data"))
+        )
+        WebDriverWait(driver, 30).until(
+            EC.presence_of_all_elements_located((By.CLASS_NAME, "hlTitle_scroll"))
+        )
+        driver.switch_to.default_content()
+
+
+def crawl_by_http(driver, frontier, archive=None):
+    """只有搜尋需要 JavaScript：取得結果列表網址與 cookie 後，交給 fetcher 並行下載"""
+    iframe = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.ID, "iframe-data"))
+    )
+    list_url = iframe.get_attribute("src")
+    cookies = {c["name"]: c["value"] for c in driver.get_cookies()}
+    asyncio.run(fetcher.crawl(list_url, ".", concurrency=CONCURRENCY, cookies=cookies, proxy=TOR_PROXY,
+                              frontier=frontier, limiter=limiter, stats=stats, archive=archive,
+                              compact=COMPACT_RECORDS, keep_html=KEEP_HTML, incremental=INCREMENTAL))
+
+
+def crawl_by_pool(driver, frontier):
+    """網站需要 JavaScript 時：把結果頁分給多個無頭瀏覽器平行處理"""
+    import browser_pool
+
+    iframe = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.ID, "iframe-data"))
+    )
+    list_url = iframe.get_attribute("src")
+    browser_pool.run_pool(list_url, POOL_PAGES, POOL_WORKERS, frontier.path, ".", cookies=driver.get_cookies(),
+                          archive_dir=ARCHIVE_DIR, compact=COMPACT_RECORDS, keep_html=KEEP_HTML)
+
+
+def crawl_by_clicking(driver, frontier, archive=None):
+    """舊流程：逐筆點擊結果連結、存檔後返回列表；已抓取的裁判書直接略過"""
     idx = 0  # 初始化索引
-    idxx= 413
+    errors = 0  # 連續錯誤次數
     
     while True:
+        href = None
         try:
             # 切換到 iframe
             iframe = WebDriverWait(driver, 20).until(
                 EC.presence_of_element_located((By.ID, "iframe-data"))
             )
             driver.switch_to.frame(iframe)
-            time.sleep(2)
             # 抓取所有裁判書連結
             case_links = WebDriverWait(driver, 20).until(
                 EC.presence_of_all_elements_located((By.CLASS_NAME, "hlTitle_scroll"))
@@ -67,14 +130,12 @@ try:
                     # 滾動到頁面底部以觸發翻頁
                     driver.switch_to.default_content()
                     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(2)  # 等待滾動完成
                     
                     # 等待 iframe 載入完成並切換
                     iframe = WebDriverWait(driver, 20).until(
                         EC.presence_of_element_located((By.ID, "iframe-data"))
                     )
                     driver.switch_to.frame(iframe)
-                    time.sleep(2)  
                     # 等待並定位下一頁按鈕
                     next_button = WebDriverWait(driver, 20).until(
                         EC.element_to_be_clickable((By.ID, "hlNext"))
@@ -82,12 +143,16 @@ try:
                     
                     # 滾動到按鈕並點擊
                     driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-                    time.sleep(1)  # 確保滾動完成
                     # 使用 JavaScript 點擊按鈕避免攔截問題
+                    limiter.acquire()
+                    started = time.perf_counter()
                     driver.execute_script("arguments[0].click();", next_button)
-                    time.sleep(2)
+                    # 舊的按鈕失效代表新的一頁已載入
+                    WebDriverWait(driver, 20).until(EC.staleness_of(next_button))
+                    elapsed = time.perf_counter() - started
+                    limiter.record(elapsed)
+                    stats.add("pagination", elapsed)
                     driver.switch_to.default_content()  # 切換回主內容 #這行看起來可以註解看看
-                    time.sleep(2)
                     '''iframe = WebDriverWait(driver, 20).until(
                         EC.presence_of_element_located((By.ID, "iframe-data"))
                     )
@@ -110,40 +175,99 @@ try:
             link = case_links[idx]
             title = link.text.strip()  # 裁判書標題
             href = link.get_attribute("href")  # 取得連結的 href 屬性
+            frontier.add([href])
+            if frontier.state(href) == FETCHED and INCREMENTAL:
+                print(f"已到達上次爬取過的裁判書，停止: {title}")
+                driver.switch_to.default_content()
+                break
+            if frontier.state(href) == FETCHED:
+                print(f"已抓取過，略過: {title}")
+                driver.switch_to.default_content()
+                idx += 1
+                continue
+            idxx = frontier.case_no(href)
             print(f"第 {idxx} 筆裁判書: {title}")
             print(f"連結: {href}\n")
             
             # 點擊該連結
+            limiter.acquire()
+            started = time.perf_counter()
             link.click()
             
-            # 等待新頁面載入
-            time.sleep(5)
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
+            # 等待詳細頁的裁判書內容出現
+            try:
+                WebDriverWait(driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, DETAIL_READY))
+                )
+            except Exception:
+                limiter.record(time.perf_counter() - started, ok=False)
+                stats.add("detail", time.perf_counter() - started, ok=False)
+                raise
+            elapsed = time.perf_counter() - started
+            limiter.record(elapsed)
+            stats.add("detail", elapsed)
             # 抓取詳細頁面的內容
-            with open(f"case_{idxx}_detail.html", "w", encoding="utf-8") as f:
-                f.write(driver.page_source)
+            store_page(driver.page_source, judgment_id_from_url(href) or href, idxx, ".", archive,
+                       COMPACT_RECORDS, KEEP_HTML)
+            frontier.mark_fetched(href)
             
             # 返回搜尋結果頁面
-            driver.back()
-            
-            # 等待回到結果頁面並保證結果已重新載入
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.ID, "iframe-data"))
-            )
+            with stats.timed("back"):
+                driver.back()
+                
+                # 等待回到結果頁面並保證結果已重新載入
+                WebDriverWait(driver, 20).until(
+                    EC.presence_of_element_located((By.ID, "iframe-data"))
+                )
             
             driver.switch_to.default_content()  # 返回主頁面
             
             idx += 1  # 處理下一筆裁判書
-            idxx+= 1
+            errors = 0
            
         except Exception as e:
             print(f"處理第 {idx+1} 筆裁判書時發生錯誤: {e}")
-            break
-            
-finally:
-    print()
-    driver.quit()
+            if href:
+                frontier.mark_failed(href, e)
+            errors += 1
+            if errors >= MAX_CONSECUTIVE_ERRORS:
+                print(f"連續 {errors} 次錯誤，中止爬取（下次執行會從佇列續抓）")
+                break
+            # 記錄失敗後跳過這一筆，下次執行再重試；停在詳細頁時先返回列表，否則之後每一筆都找不到連結
+            driver.switch_to.default_content()
+            try:
+                if not driver.find_elements(By.ID, "iframe-data"):
+                    driver.back()
+                    WebDriverWait(driver, 20).until(
+                        EC.presence_of_element_located((By.ID, "iframe-data"))
+                    )
+            except Exception as back_error:
+                print(f"返回結果頁失敗: {back_error}")
+            idx += 1
+
 
-   
\ No newline at end of file
+if __name__ == "__main__":
+    frontier = Frontier(FRONTIER_PATH, start_index=413)  # 起始檔案編號只在佇列為空時使用
+    archive = JudgmentArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
+    driver = create_driver()
+    try:
+        open_search(driver)
+        if FETCH_MODE == "http":
+            crawl_by_http(driver, frontier, archive)
+        elif FETCH_MODE == "pool":
+            crawl_by_pool(driver, frontier)
+        else:
+            run_started = time.time()
+            crawl_by_clicking(driver, frontier, archive)
+            if INCREMENTAL:
+                rows = frontier.fetched_since(run_started)
+                frontier.update_watermark(jid for _, jid, _ in rows)
+                if rows:
+                    print(f"增量清單已寫入 {fetcher.write_delta(rows)}")
+    finally:
+        print(f"爬取佇列狀態: {frontier.counts()}")
+        stats.summary()
+        frontier.close()
+        if archive is not None:
+            archive.close()
+        driver.quit()
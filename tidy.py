@@ -1,57 +1,226 @@
-import pandas as pd
 from bs4 import BeautifulSoup
 import re
 import os
-import requests
+import hashlib
+import multiprocessing
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import pdfplumber
 
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # 沒有 lxml 時退回 BeautifulSoup 的 html.parser
+    lxml_html = None
+
+import compact_record
+from archive import JudgmentArchive, judgment_id_from_html
+from manifest import Manifest
+from row_writer import RowWriter
+from legal_numerals import format_sentence
+from pdf_cache import PdfCache, BASE_URL
+
 # 設定資料夾和輸出路徑
 input_dir = "C:/Users/李/Desktop/數據分析"
 output_path = "C:/Users/李/Desktop/數據分析/importantcsv/import.csv"
+archive_dir = None  # 設定為封存庫資料夾時，改從封存庫讀取裁判書 HTML
+manifest_path = None  # 整理紀錄，預設放在輸出檔旁；重新執行時只整理新增或變更的來源
+batch_size = 1000  # 每整理這麼多份提交一次整理紀錄，輸出時每批寫出這麼多列
+workers = os.cpu_count() or 1  # 平行整理的程序數，1 為逐筆處理
+pdf_cache_dir = None  # PDF 快取資料夾，預設為 input_dir/pdf_cache；重新整理時不再重複下載
+pdf_cache_max_bytes = 2 * 1024 ** 3  # PDF 快取大小上限，超過時淘汰最久未使用的
+pdf_base_url = BASE_URL  # PDF 下載網址前綴，測試時可指向本地替身伺服器
+pdf_concurrency = 4  # PDF 同時下載數上限，平行整理時由所有程序共用
+# "pdf"：一律從 PDF 提取（原本的輸出）；"html"：內文與附表取自頁面，必要時才讀 PDF。
+# html 尚未以存檔頁面逐列比對確認與 pdf 相同（python tidy.py --compare-modes），確認前維持 pdf
+extraction_mode = "pdf"
+
+IN_FLIGHT_PER_WORKER = 4  # 平行整理時每個程序最多同時排隊的批數
+
+SOURCE_PATTERN = re.compile(r"case_(\d+)_detail\.(html|json)")
+
+# 預先編譯的 XPath，對應 title、.int-table .row:nth-child(2) .col-td 與 a#hlExportPDF
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+if lxml_html is not None:
+    TITLE_XPATH = etree.XPath("//title")
+    DATE_XPATH = etree.XPath(
+        f"//*[{_has_class('int-table')}]//*[{_has_class('row')}][count(preceding-sibling::*) = 1]"
+        f"//*[{_has_class('col-td')}]"
+    )
+    PDF_XPATH = etree.XPath("//a[@id = 'hlExportPDF']")
+    # 內文區塊，與 compact_record.extract_body 相同：新版 .htmlcontent，舊版 .text-pre
+    CONTENT_XPATH = etree.XPath(f"//*[{_has_class('htmlcontent')}]")
+    PRE_XPATH = etree.XPath(f"//*[{_has_class('text-pre')}]")
+
+# 找出所有來源：[(來源名稱, 排序鍵, 簽章)]；資料夾中的 case_{n}_detail 檔依 n 排序（同編號優先用 HTML），
+# 封存庫依寫入順序；簽章用來判斷來源是否變更（檔案為大小與修改時間，封存庫為內容雜湊）
+def discover_sources():
+    if archive_dir:
+        with JudgmentArchive(archive_dir) as archive:
+            return [(jid, n, archive.index[jid][0]) for n, jid in enumerate(archive.keys())]
+    found = {}
+    for entry in os.scandir(input_dir):
+        match = SOURCE_PATTERN.fullmatch(entry.name)
+        if match is None:
+            continue
+        n = int(match.group(1))
+        if n in found and match.group(2) == "json":
+            continue
+        stat = entry.stat()
+        found[n] = (entry.path, n, f"{stat.st_size}:{stat.st_mtime_ns}")
+    return [found[n] for n in sorted(found)]
+
+# 依序產生 (來源名稱, 內容)；sources 指定只讀哪些來源，預設為全部；內容可為完整 HTML 或精簡紀錄
+def iter_sources(sources=None):
+    if archive_dir:
+        with JudgmentArchive(archive_dir) as archive:
+            for jid in (archive.keys() if sources is None else sources):
+                yield jid, archive.get(jid)
+        return
+    for file_path in ([source for source, _, _ in discover_sources()] if sources is None else sources):
+        # 讀取 HTML
+        with open(file_path, "r", encoding="utf-8") as file:
+            yield file_path, file.read()
+
+# 從完整 HTML 或精簡紀錄取出後續需要的標題、日期欄與 PDF 連結
+def page_info(content):
+    if compact_record.is_record(content):
+        record = compact_record.loads(content)
+        date_text = record["meta"][1][1] if len(record["meta"]) > 1 else None
+        return {"id": record["id"], "title": record["title"], "date_text": date_text, "pdf_href": record["pdf_href"],
+                "body": record["body"], "tables": record["tables"]}
+    if lxml_html is not None:
+        return _page_info_lxml(content)
+    soup = BeautifulSoup(content, "html.parser")
+    title = soup.find("title")
+    date_elem = soup.select_one(".int-table .row:nth-child(2) .col-td")
+    pdf_link = soup.find("a", id="hlExportPDF")
+    body, tables = compact_record.extract_body(soup)
+    return {
+        "id": judgment_id_from_html(content),
+        "title": title.text.strip() if title else None,
+        "date_text": date_elem.text.strip() if date_elem else None,
+        "pdf_href": pdf_link["href"] if pdf_link else None,
+        "body": body,
+        "tables": tables,
+    }
+
+def _page_info_lxml(content):
+    tree = lxml_html.fromstring(content)
+    title = TITLE_XPATH(tree)
+    date_elem = DATE_XPATH(tree)
+    pdf_link = PDF_XPATH(tree)
+    return {
+        "id": judgment_id_from_html(content),
+        "title": title[0].text_content().strip() if title else None,
+        "date_text": date_elem[0].text_content().strip() if date_elem else None,
+        "pdf_href": pdf_link[0].attrib["href"] if pdf_link else None,
+        **_body_lxml(tree),
+    }
+
+def _cell_text_lxml(cell):
+    return "".join(t.strip() for t in cell.itertext())
+
+# lxml 版的 compact_record.extract_body：內文與附表（略過隱藏的儲存格）
+def _body_lxml(tree):
+    content = CONTENT_XPATH(tree)
+    if content:
+        paragraphs = [child.text_content() for child in content[0] if child.tag == "div"]
+        tables = []
+        for table in content[0].iter("table"):
+            rows = []
+            for tr in table.iter("tr"):
+                cells = [
+                    _cell_text_lxml(cell) for cell in tr.iter("td", "th")
+                    if "display: none" not in (cell.get("style") or "")
+                ]
+                if any(cells):
+                    rows.append(cells)
+            if rows:
+                tables.append(rows)
+        return {"body": "\n".join(paragraphs), "tables": tables}
+    for pre in PRE_XPATH(tree):
+        text = pre.text_content()
+        if text.strip():
+            return {"body": text, "tables": []}
+    return {"body": "", "tables": []}
+
+# 頁面上的附表多半是直式（第一欄為「編號、罪名、宣告刑…」），先轉成第一列為表頭再交給 table_rows
+def html_table_rows(tables):
+    for table in tables:
+        first_column = [row[0] for row in table if row]
+        if any("罪" in cell for cell in first_column) and any("刑" in cell for cell in first_column):
+            width = max(len(row) for row in table)
+            table = [list(column) for column in zip(*(row + [""] * (width - len(row)) for row in table))]
+        yield from table_rows([table])
+
+# 每個程序各自建立一個 PDF 快取（共用同一個資料夾）；平行整理時下載名額由主程序建立、所有程序共用
+_pdf_cache = None
+_download_slots = None
+
+def get_pdf_cache():
+    global _pdf_cache
+    if _pdf_cache is None:
+        _pdf_cache = PdfCache(pdf_cache_dir or os.path.join(input_dir, "pdf_cache"), pdf_cache_max_bytes,
+                              pdf_base_url, pdf_concurrency, _download_slots)
+    return _pdf_cache
+
+# 逐頁只走一次，每頁的文字與表格各抽取一次；extract_tables 預設依框線找表格，
+# 頁面沒有任何框線時必定抽不出表格，只有這種頁面略過 extract_tables
+def read_pdf(pdf_path):
+    texts = []
+    tables = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            texts.append(text)
+            if page.edges:
+                tables.extend(page.extract_tables())
+            page.close()  # 釋放該頁快取的物件，長篇裁判書不必整份留在記憶體
+    return "".join(texts), tables
+
+# 舊的做法：每頁 extract_text 兩次，再對每一頁 extract_tables；只留給 benchmark_pdf 比較
+def _read_pdf_two_pass(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        text = "".join(page.extract_text() or "" for page in pdf.pages if page.extract_text())
+        tables = [table for page in pdf.pages for table in page.extract_tables()]
+    return text, tables
 
-# 中文數字轉換
-def chinese_to_number(text):
-    mapping = {'零': 0, '壹': 1, '貳': 2, '參': 3, '肆': 4, '伍': 5, '陸': 6, '柒': 7, '捌': 8, '玖': 9, 
-               '拾': 10, '佰': 100, '仟': 1000, '萬': 10000}
-    num = 0
-    temp = 0
-    for char in text:
-        if char in mapping:
-            if char in '拾佰仟萬':
-                temp = temp or 1
-                num += temp * mapping[char]
-                temp = 0
-            else:
-                temp = mapping[char]
-    return num + temp if temp else num
-
-# 初始化資料列表
-all_cases = []
-
-# 迴圈處理檔案
-for i in range(1, 411):  
-    file_path = os.path.join(input_dir, f"case_{i}_detail.html")
-    
-    if not os.path.exists(file_path):
-        print(f"⚠️ 檔案不存在：{file_path}")
-        continue
-
-    # 讀取 HTML
-    with open(file_path, "r", encoding="utf-8") as file:
-        html_content = file.read()
-
-    soup = BeautifulSoup(html_content, "html.parser")
+# 從附表取出 (罪名, 刑期)：表頭找含「罪」（非日期）與含「刑」的欄
+def table_rows(tables):
+    for table in tables:
+        if table and len(table) > 1:
+            headers = table[0]
+            offense_idx = -1
+            sentence_idx = -1
+            for idx, header in enumerate(headers):
+                if header and "罪" in header and "日期" not in header:
+                    offense_idx = idx
+                if header and "刑" in header:
+                    sentence_idx = idx
+            if offense_idx != -1 and sentence_idx != -1:
+                for row in table[1:]:
+                    if len(row) > max(offense_idx, sentence_idx):
+                        offense = row[offense_idx].strip() if row[offense_idx] else ""
+                        sentence = row[sentence_idx].strip() if row[sentence_idx] else "未知"
+                        if offense and "罪" in offense:
+                            yield offense, sentence
 
+# 整理單一案件：基本資訊來自 page_info，其餘從 PDF 提取
+def extract_case(file_path, info, fetch_pdf=True):
     # 從 <title> 提取基本資訊
-    court_name = soup.find("title").text.strip().split(" ")[0] if soup.find("title") else "未知"
-    title_text = soup.find("title").text.strip() if soup.find("title") else ""
+    court_name = info["title"].split(" ")[0] if info["title"] is not None else "未知"
+    title_text = info["title"] if info["title"] is not None else ""
     # 從 <title> 提取日期
     date_match = re.search(r"(\d{3,4})\s*年度", title_text)
     judgment_date = f"民國 {date_match.group(1)} 年" if date_match else "未知"
     # 從 HTML 提取更精確日期
-    date_elem = soup.select_one(".int-table .row:nth-child(2) .col-td")
-    if date_elem:
-        judgment_date = date_elem.text.strip()
+    if info["date_text"] is not None:
+        judgment_date = info["date_text"]
     case_type = "聲請定應執行刑" if "聲字第" in title_text else "未知"
 
     # 提取相關法條、罪名、刑期和上下文
@@ -60,82 +229,63 @@ for i in range(1, 411):
     sentences = []
     raw_content = []
 
-    # 從 PDF 提取
-    pdf_link = soup.find("a", id="hlExportPDF")
-    if pdf_link:
-        pdf_url = "https://judgment.judicial.gov.tw" + pdf_link["href"]
-        pdf_path = os.path.join(input_dir, f"case_{i}_detail.pdf")
-        
+    # 內文優先取自頁面本身，只有頁面沒有內文、或提到附表卻找不到可用的表格時才讀 PDF
+    text = info.get("body") if extraction_mode == "html" else None
+    tables = (info.get("tables") or []) if text else []
+    table_source = html_table_rows
+    needs_tables = bool(text) and ("附表" in text or "附件" in text) and not any(html_table_rows(tables))
+    if (not text or needs_tables) and info["pdf_href"] and fetch_pdf:
         try:
-            response = requests.get(pdf_url, timeout=10)
-            with open(pdf_path, "wb") as pdf_file:
-                pdf_file.write(response.content)
-
-            with pdfplumber.open(pdf_path) as pdf:
-                text = "".join(page.extract_text() or "" for page in pdf.pages if page.extract_text())
-                
-                # 提取日期（備用）
-                if judgment_date == "未知":
-                    date_match = re.search(r"民國\s*(\d{3,4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日", text)
-                    if date_match:
-                        judgment_date = f"民國 {date_match.group(1)} 年 {date_match.group(2)} 月 {date_match.group(3)} 日"
-                
-                # 提取案件類型
-                if case_type == "未知":
-                    case_match = re.search(r"裁判案由\D*([^\n]+)", text)
-                    case_type = case_match.group(1).strip() if case_match else "未知"
-                
-                # 提取主文
-                main_match = re.search(r"主\s*文\s*(.+?)(?:事\s*實|理\s*由|$)", text, re.DOTALL)
-                if main_match:
-                    main_content = main_match.group(1).strip()
-                    raw_content.append(re.sub(r'\n\d+\s*', ' ', main_content))  # 移除行號
-                    offense_match = re.findall(r"犯(.+?罪)", main_content)
-                    sentence_match = re.findall(r"處\s*([^，。]+[年月日])|應執行([^，。]+[年月日])", main_content)
-                    if offense_match:
-                        offenses.extend([o.strip() for o in offense_match])
-                    if sentence_match:
-                        for match in sentence_match:
-                            sentence = next((s for s in match if s), None)
-                            if sentence:
-                                sentences.append(sentence.strip())
-                
-                # 提取附表
-                for page in pdf.pages:
-                    tables = page.extract_tables()
-                    for table in tables:
-                        if table and len(table) > 1:
-                            headers = table[0]
-                            offense_idx = -1
-                            sentence_idx = -1
-                            for idx, header in enumerate(headers):
-                                if header and "罪" in header and "日期" not in header:
-                                    offense_idx = idx
-                                if header and "刑" in header:
-                                    sentence_idx = idx
-                            if offense_idx != -1 and sentence_idx != -1:
-                                for row in table[1:]:
-                                    if len(row) > max(offense_idx, sentence_idx):
-                                        offense = row[offense_idx].strip() if row[offense_idx] else ""
-                                        sentence = row[sentence_idx].strip() if row[sentence_idx] else "未知"
-                                        if offense and "罪" in offense:
-                                            offenses.append(offense)
-                                            sentences.append(sentence)
-                                            raw_content.append(f"{offense}，處{sentence}")
-                
-                # 提取法條
-                law_match = re.findall(r"(?:中華民國刑法|刑事訴訟法|洗錢防制法)[^\n]+", text)
-                if law_match:
-                    laws.extend(law_match)
-
-            os.remove(pdf_path)
+            pdf_path = get_pdf_cache().get(info["pdf_href"])
+            pdf_text, tables = read_pdf(pdf_path)
+            table_source = table_rows
+            text = text or pdf_text
         except Exception as e:
             print(f"⚠️ PDF 下載或解析失敗：{file_path}，錯誤：{e}")
 
+    if text:
+        # 提取日期（備用）
+        if judgment_date == "未知":
+            date_match = re.search(r"民國\s*(\d{3,4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日", text)
+            if date_match:
+                judgment_date = f"民國 {date_match.group(1)} 年 {date_match.group(2)} 月 {date_match.group(3)} 日"
+
+        # 提取案件類型
+        if case_type == "未知":
+            case_match = re.search(r"裁判案由\D*([^\n]+)", text)
+            case_type = case_match.group(1).strip() if case_match else "未知"
+
+        # 提取主文
+        main_match = re.search(r"主\s*文\s*(.+?)(?:事\s*實|理\s*由|$)", text, re.DOTALL)
+        if main_match:
+            main_content = main_match.group(1).strip()
+            raw_content.append(re.sub(r'\n\d+\s*', ' ', main_content))  # 移除行號
+            offense_match = re.findall(r"犯(.+?罪)", main_content)
+            sentence_match = re.findall(r"處\s*([^，。]+[年月日])|應執行([^，。]+[年月日])", main_content)
+            if offense_match:
+                offenses.extend([o.strip() for o in offense_match])
+            if sentence_match:
+                for match in sentence_match:
+                    sentence = next((s for s in match if s), None)
+                    if sentence:
+                        sentences.append(sentence.strip())
+
+        # 提取附表
+        for offense, sentence in table_source(tables):
+            offenses.append(offense)
+            sentences.append(sentence)
+            raw_content.append(f"{offense}，處{sentence}")
+
+        # 提取法條
+        law_match = re.findall(r"(?:中華民國刑法|刑事訴訟法|洗錢防制法)[^\n]+", text)
+        if law_match:
+            laws.extend(law_match)
+
     # 清理格式
-    offenses = list(set(o.strip() for o in offenses if o.strip() and "罪" in o and "日期" not in o and "編號" not in o)) or ["未知"]
+    # 依出現順序去重（set 的順序在各程序間不固定，平行整理時輸出會不同）
+    offenses = list(dict.fromkeys(o.strip() for o in offenses if o.strip() and "罪" in o and "日期" not in o and "編號" not in o)) or ["未知"]
     sentences = [re.sub(r"如易科罰金.*$", "", s.strip()) for s in sentences if s.strip()]
-    sentences = [f"{chinese_to_number(re.sub(r'[年月日]', '', s))}{next((c for c in '年月日' if c in s), '月' if '有期徒刑' in s else '日' if '拘役' in s else '')}" 
+    sentences = [format_sentence(s, '月' if '有期徒刑' in s else '日' if '拘役' in s else '')
                  for s in sentences if any(c in s for c in "年月日") or "有期徒刑" in s or "拘役" in s] or ["未知"]
 
     # 若罪名含「如附表所示」，用附表罪名替換
@@ -150,13 +300,213 @@ for i in range(1, 411):
         "罪名": "; ".join(offenses),
         "刑期": "; ".join(sentences),
         "相關法條": "; ".join(laws) if laws else "無",
-        "原始內容": "; ".join(raw_content) if raw_content else "無"
+        "原始內容": "; ".join(raw_content) if raw_content else "無",
+        # 資料列的識別碼，頁面上找不到裁判書 ID 時用來源名稱
+        "裁判書ID": info.get("id") or os.path.splitext(os.path.basename(file_path))[0],
     }
+    return case_data
+
+# 驗證模式：同一份頁面分別以完整 HTML 與精簡紀錄整理，確認產出相同的資料列
+def verify_compact(fetch_pdf=False):
+    mismatches = 0
+    checked = 0
+    for file_path, content in iter_sources():
+        if compact_record.is_record(content):
+            continue
+        record = compact_record.dumps(compact_record.extract_record(content))
+        full_row = extract_case(file_path, page_info(content), fetch_pdf)
+        compact_row = extract_case(file_path, page_info(record), fetch_pdf)
+        checked += 1
+        if full_row != compact_row:
+            mismatches += 1
+            print(f"❌ 資料列不一致：{file_path}\n  HTML：{full_row}\n  精簡：{compact_row}")
+    print(f"📋 已比對 {checked} 份，不一致 {mismatches} 份")
+    return mismatches == 0
+
+# 比對兩種內文來源：同一份頁面分別以 pdf 與 html 模式整理，逐欄統計不同的資料列
+def compare_modes(fetch_pdf=True, examples=3):
+    global extraction_mode
+    original_mode = extraction_mode
+    differences = {}
+    checked = 0
+    try:
+        for file_path, content in iter_sources():
+            info = page_info(content)
+            rows = {}
+            for mode in ("pdf", "html"):
+                extraction_mode = mode
+                rows[mode] = extract_case(file_path, info, fetch_pdf)
+            checked += 1
+            for field, pdf_value in rows["pdf"].items():
+                if rows["html"][field] != pdf_value:
+                    samples = differences.setdefault(field, [])
+                    samples.append(file_path)
+                    if len(samples) <= examples:
+                        print(f"⚠️ {field} 不同：{file_path}\n  pdf：{pdf_value}\n  html：{rows['html'][field]}")
+    finally:
+        extraction_mode = original_mode
+    print(f"📋 已比對 {checked} 份，" + ("兩種模式的資料列完全相同" if not differences else
+          "，".join(f"{field} 不同 {len(files)} 份" for field, files in differences.items())))
+    return not differences
+
+# 程序池中執行的單位工作：解析頁面並整理成一列
+def process_source(source, fetch_pdf=True):
+    file_path, content = source
+    return file_path, extract_case(file_path, page_info(content), fetch_pdf)
+
+def _process_chunk(chunk, fetch_pdf=True):
+    return [process_source(source, fetch_pdf) for source in chunk]
+
+# 子程序重新匯入本模組，需帶入主程序修改過的設定（PDF 快取位置依 input_dir）
+def _init_worker(dir_path, cache_dir, base_url, mode, download_slots):
+    global input_dir, pdf_cache_dir, pdf_base_url, extraction_mode, _download_slots
+    input_dir = dir_path
+    pdf_cache_dir = cache_dir
+    pdf_base_url = base_url
+    extraction_mode = mode
+    _download_slots = download_slots
+
+# 依來源順序產生 (來源名稱, 資料列)；workers > 1 時分散到多個程序，結果順序與逐筆處理相同
+def iter_cases(worker_count=None, fetch_pdf=True, sources=None):
+    worker_count = worker_count or workers
+    sources = iter_sources() if sources is None else sources
+    if worker_count <= 1:
+        for source in sources:
+            yield process_source(source, fetch_pdf)
+        return
+    # PDF 下載耗時不一，一次交一份讓各程序負載平均；不下載時每次交 16 份，減少程序間往返
+    chunk_size = 1 if fetch_pdf else 16
+    # 下載名額在程序啟動時傳入（multiprocessing 的號誌只能這樣共用），所有程序合計不超過 pdf_concurrency
+    download_slots = multiprocessing.BoundedSemaphore(pdf_concurrency) if fetch_pdf else None
+    config = (input_dir, pdf_cache_dir, pdf_base_url, extraction_mode, download_slots)
+    with ProcessPoolExecutor(max_workers=worker_count, initializer=_init_worker, initargs=config) as pool:
+        # 不用 pool.map：它會先讀完所有來源（連同內容）送進佇列，記憶體隨資料量成長。
+        # 最多 IN_FLIGHT_PER_WORKER × 程序數 批在處理中，依送出順序取回結果後才讀下一批
+        pending = deque()
+        sources = iter(sources)
+        while True:
+            while len(pending) < worker_count * IN_FLIGHT_PER_WORKER:
+                chunk = list(islice(sources, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_process_chunk, chunk, fetch_pdf))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
+def main(worker_count=None, fetch_pdf=True, path=None, full=False, manifest_file=None):
+    path = path or output_path
+    # 中途失敗時關閉紀錄即保留已整理的資料列，下次執行從那之後繼續
+    with Manifest(manifest_file or manifest_path or os.path.splitext(path)[0] + "_manifest.sqlite") as manifest:
+        discovered = discover_sources()
+        order = {source: (sort_key, signature) for source, sort_key, signature in discovered}
+        removed = manifest.sources() - set(order)
+        manifest.remove(removed)
+        candidates = [source for source, _, signature in discovered if full or not manifest.unchanged(source, signature)]
+        digests = {}
+
+        # 簽章變了才讀檔；內容雜湊沒變的只更新簽章，不重新整理
+        def changed_sources():
+            for source, content in iter_sources(candidates):
+                digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+                if not full and manifest.same_digest(source, digest):
+                    manifest.touch(source, *order[source])
+                    continue
+                digests[source] = digest
+                yield source, content
+
+        # 迴圈處理檔案；每批提交一次
+        processed = 0
+        for file_path, case_data in iter_cases(worker_count, fetch_pdf, changed_sources()):
+            sort_key, signature = order[file_path]
+            manifest.upsert(file_path, sort_key, signature, digests.pop(file_path), case_data["裁判書ID"], case_data)
+            processed += 1
+            if processed % batch_size == 0:
+                manifest.commit()
+            print(f"✅ 已處理：{file_path}")
+        manifest.commit()
+        print(f"📋 共 {len(discovered)} 份來源，整理 {processed} 份，移除 {len(removed)} 份，"
+              f"其餘 {len(discovered) - processed} 份沿用上次結果")
+
+        # 分批串流寫出 CSV 或 Parquet（依副檔名），完成後才取代舊的輸出檔
+        with RowWriter(path, batch_size) as writer:
+            writer.write_rows(manifest.rows())
+    print(f"📂 所有案件資料已儲存為：{path}（{writer.count} 筆）")
+    return path
+
+# 比較逐筆與平行整理的耗時，並確認兩者輸出的 CSV 逐位元組相同
+def benchmark(worker_count=None, fetch_pdf=False):
+    import filecmp
+    import tempfile
+
+    worker_count = worker_count or workers
+    out_dir = tempfile.mkdtemp(prefix="tidy_bench_")
+    results = {}
+    for name, count in (("serial", 1), ("parallel", worker_count)):
+        started = time.perf_counter()
+        path = main(count, fetch_pdf, os.path.join(out_dir, f"{name}.csv"), manifest_file=":memory:")
+        results[name] = (path, time.perf_counter() - started)
+    serial_path, serial_time = results["serial"]
+    parallel_path, parallel_time = results["parallel"]
+    same = filecmp.cmp(serial_path, parallel_path, shallow=False)
+    print(f"📋 逐筆 {serial_time:.2f} 秒，{worker_count} 程序 {parallel_time:.2f} 秒"
+          f"（{serial_time / max(parallel_time, 1e-9):.1f}x），輸出{'相同' if same else '不同'}")
+    return same
+
+# 比較逐頁單次抽取與舊的兩次抽取：耗時與附表列是否相同（預設使用 PDF 快取中的檔案）
+def benchmark_pdf(pdf_dir=None):
+    pdf_dir = pdf_dir or get_pdf_cache().path
+    paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.endswith(".pdf"))
+    old_time = new_time = 0.0
+    mismatches = 0
+    for path in paths:
+        started = time.perf_counter()
+        old_text, old_tables = _read_pdf_two_pass(path)
+        old_time += time.perf_counter() - started
+        started = time.perf_counter()
+        new_text, new_tables = read_pdf(path)
+        new_time += time.perf_counter() - started
+        if old_text != new_text or list(table_rows(old_tables)) != list(table_rows(new_tables)):
+            mismatches += 1
+            print(f"❌ 抽取結果不同：{path}")
+    print(f"📋 {len(paths)} 份 PDF：舊做法 {old_time:.2f} 秒，逐頁單次 {new_time:.2f} 秒"
+          f"（{old_time / max(new_time, 1e-9):.1f}x），不一致 {mismatches} 份")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    import argparse
 
-    all_cases.append(case_data)
-    print(f"✅ 已處理：{file_path}")
+    parser = argparse.ArgumentParser(description="整理裁判書頁面為 import.csv")
+    parser.add_argument("--input", help="裁判書頁面資料夾（預設為 input_dir）")
+    parser.add_argument("--archive", help="改從此封存庫讀取")
+    parser.add_argument("--output", help="輸出 CSV 路徑（預設為 output_path）")
+    parser.add_argument("--manifest", help="整理紀錄路徑（預設為輸出檔旁的 *_manifest.sqlite）")
+    parser.add_argument("--full", action="store_true", help="忽略整理紀錄，全部重新整理")
+    parser.add_argument("--workers", type=int, default=workers, help="平行程序數，1 為逐筆處理")
+    parser.add_argument("--mode", choices=["html", "pdf"], default=extraction_mode, help="內文來源")
+    parser.add_argument("--no-pdf", action="store_true", help="不下載 PDF，只整理頁面資訊")
+    parser.add_argument("--pdf-cache", help="PDF 快取資料夾（預設為 input_dir/pdf_cache）")
+    parser.add_argument("--pdf-base-url", help="PDF 下載網址前綴（本地測試用）")
+    parser.add_argument("--verify-compact", action="store_true", help="比對完整 HTML 與精簡紀錄的整理結果")
+    parser.add_argument("--with-pdf", action="store_true", help="--verify-compact 時一併下載 PDF")
+    parser.add_argument("--compare-modes", action="store_true", help="逐列比對 pdf 與 html 兩種內文來源的整理結果")
+    parser.add_argument("--benchmark", action="store_true", help="比較逐筆與平行整理的耗時與輸出")
+    parser.add_argument("--benchmark-pdf", action="store_true", help="比較 PDF 逐頁單次抽取與舊做法")
+    args = parser.parse_args()
+    input_dir = args.input or input_dir
+    archive_dir = args.archive or archive_dir
+    output_path = args.output or output_path
+    manifest_path = args.manifest or manifest_path
+    pdf_cache_dir = args.pdf_cache or pdf_cache_dir
+    pdf_base_url = args.pdf_base_url or pdf_base_url
+    extraction_mode = args.mode
 
-# 轉換為 DataFrame 並存成 CSV
-df = pd.DataFrame(all_cases)
-df.to_csv(output_path, index=False, encoding="utf-8-sig")
-print(f"📂 所有案件資料已儲存為：{output_path}")
\ No newline at end of file
+    if args.verify_compact:
+        sys.exit(0 if verify_compact(fetch_pdf=args.with_pdf) else 1)
+    if args.compare_modes:
+        sys.exit(0 if compare_modes(fetch_pdf=not args.no_pdf) else 1)
+    if args.benchmark_pdf:
+        sys.exit(0 if benchmark_pdf() else 1)
+    if args.benchmark:
+        sys.exit(0 if benchmark(args.workers, fetch_pdf=not args.no_pdf) else 1)
+    main(args.workers, fetch_pdf=not args.no_pdf, full=args.full)
@@ -1,14 +1,19 @@
-import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
+from case_dataset import load_dataset
+from embedding_cache import EmbeddingCache
+from embedding_server import load_model
+
 # 數據載入與嵌入
-df = pd.read_csv('C:/Users/李/Desktop/數據分析/outputarea/Tovector.csv')
-model = SentenceTransformer('DMetaSoul/sbert-chinese-general-v2')
-text_embeddings = model.encode(df["原始內容"].tolist())
+df = load_dataset('C:/Users/李/Desktop/數據分析/outputarea/Tovector', columns=['原始內容', '刑期(天)'])
+model = load_model('DMetaSoul/sbert-chinese-general-v2')
+# 向量快取：同一段原始內容只送進模型一次，再次執行時直接讀取 embedding_cache/
+embeddings = EmbeddingCache(model, 'DMetaSoul/sbert-chinese-general-v2')
+text_embeddings = embeddings.encode(df["原始內容"].tolist())
+print(f"📋 向量快取：{embeddings.report()}")
 
 # 準備特徵和標籤
 X = text_embeddings